@@ -2,6 +2,8 @@ import pygame
 import datetime
 import pytz
 import random
+import numpy as np
+from collections import OrderedDict
 from astral import LocationInfo
 from astral.sun import sun
 from colorsys import rgb_to_hsv, hsv_to_rgb
@@ -9,67 +11,185 @@ from util import interpolate_color
 from cloud import Cloud
 from star import Star
 
-def get_sun_times(location):
-    """Retrieve sunrise and sunset times for the current day."""
-    now = datetime.datetime.now(pytz.timezone(location.timezone))
-    s = sun(location.observer, date=now.date(), tzinfo=location.timezone)
-    return s["sunrise"].astimezone(pytz.timezone(location.timezone)), s["sunset"].astimezone(pytz.timezone(location.timezone))
+# Key sky colors
+COLOR_NIGHT = (10, 10, 40)
+COLOR_DAWN = (255, 120, 70)
+COLOR_DAY = (135, 206, 250)
+COLOR_SUNSET = (255, 90, 40)
+COLOR_TWILIGHT = (25, 25, 112)
 
-def get_background_color(location, sunrise, sunset):
-    now = datetime.datetime.now(pytz.timezone(location.timezone))
+def get_sun_times(location, date=None):
+    """Retrieve sunrise and sunset times for the given day, today by default."""
+    tz = pytz.timezone(location.timezone)
+    if date is None:
+        date = datetime.datetime.now(tz).date()
+    s = sun(location.observer, date=date, tzinfo=location.timezone)
+    return s["sunrise"].astimezone(tz), s["sunset"].astimezone(tz)
 
-    # Define key colors
-    color_night = (10, 10, 40)
-    color_dawn = (255, 120, 70)
-    color_day = (135, 206, 250)
-    color_sunset = (255, 90, 40)
-    color_twilight = (25, 25, 112)
+def get_background_color(location, sunrise, sunset, now=None):
+    if now is None:
+        now = datetime.datetime.now(pytz.timezone(location.timezone))
+    print (f"Current time: {now}, Sunrise: {sunrise}, Sunset: {sunset}")
+    return sky_color_at(now, sunrise, sunset)
 
+def sky_color_at(now, sunrise, sunset):
+    """Return the sky color at now, blending through dawn and dusk around the sun times."""
     dawn_start = sunrise - datetime.timedelta(minutes=45)
     dusk_end = sunset + datetime.timedelta(minutes=45)
 
-    print (f"Current time: {now}, Sunrise: {sunrise}, Sunset: {sunset}, Dawn start: {dawn_start}, Dusk end: {dusk_end}")
-    
     if now < dawn_start:
         # Deep night
-        print("Deep night")
-        return color_night
+        return COLOR_NIGHT
     elif dawn_start <= now < sunrise:
         # Dawn transition
-        print("Dawn transition")
         factor = (now - dawn_start).total_seconds() / (sunrise - dawn_start).total_seconds()
-        return interpolate_color(color_night, color_dawn, factor)
+        return interpolate_color(COLOR_NIGHT, COLOR_DAWN, factor)
     elif sunrise <= now < (sunrise + datetime.timedelta(minutes=30)):
         # Morning transition
-        print("Morning transition")
         factor = (now - sunrise).total_seconds() / (30 * 60)
-        return interpolate_color(color_dawn, color_day, factor)
+        return interpolate_color(COLOR_DAWN, COLOR_DAY, factor)
     elif (sunrise + datetime.timedelta(minutes=30)) <= now < (sunset - datetime.timedelta(minutes=30)):
         # Daytime
-        print("Daytime")
-        return color_day
+        return COLOR_DAY
     elif (sunset - datetime.timedelta(minutes=30)) <= now < sunset:
         # Pre-sunset transition
-        print("Pre-sunset transition")
         factor = (now - (sunset - datetime.timedelta(minutes=30))).total_seconds() / (30 * 60)
-        return interpolate_color(color_day, color_sunset, factor)
+        return interpolate_color(COLOR_DAY, COLOR_SUNSET, factor)
     elif sunset <= now < dusk_end:
         # Sunset to night transition
-        print("Sunset to night transition")
         factor = (now - sunset).total_seconds() / (dusk_end - sunset).total_seconds()
-        return interpolate_color(color_sunset, color_night, factor)
+        return interpolate_color(COLOR_SUNSET, COLOR_NIGHT, factor)
     else:
         # Night
-        print("Night")
-        return color_night
+        return COLOR_NIGHT
 
 
-def draw_background_gradient(surface, screen_height, screen_width, top_color, bottom_color):
-    """Draw a vertical gradient from top_color to bottom_color."""
-    for y in range(screen_height):
-        factor = y / screen_height
-        color = interpolate_color(top_color, bottom_color, factor)
-        pygame.draw.line(surface, color, (0, y), (screen_width, y))
+class SkyTimeline:
+    """Top and bottom sky colors for every minute of one local day.
+
+    Rows are minutes elapsed since local midnight, so a day that switches to
+    or from daylight saving time has 23 or 25 hours of rows.  Built once per day (or when the location changes) from the day's sun
+    times, so the render loop gets the current sky colors with an index
+    lookup and dawn and dusk blend minute by minute instead of hourly.  The
+    sun times come from an ephemeris.EphemerisTable when one covering the day
+    is given, and are computed otherwise.
+    """
+
+    def __init__(self, location, date=None, ephemeris=None):
+        self.location = location
+        self.tz = pytz.timezone(location.timezone)
+        if date is None:
+            date = datetime.datetime.now(self.tz).date()
+        self.date = date
+        sun_times = ephemeris.sun_times(date) if ephemeris is not None else None
+        self.sunrise, self.sunset = sun_times or get_sun_times(location, date)
+        self.midnight = _local_midnight(self.tz, date)
+        day_length = _local_midnight(self.tz, date + datetime.timedelta(days=1)) - self.midnight
+        minutes = self.midnight + np.arange(int(day_length // 60)) * 60.0
+        self.top = _sky_colors(minutes, self.sunrise.timestamp(), self.sunset.timestamp())
+        # The bottom of the sky is a darker shade of the top
+        self.bottom = np.trunc(self.top * 0.5).astype(np.uint8)
+
+    @classmethod
+    def for_time(cls, location, now, ephemeris=None):
+        """Build the timeline for the local day at location that contains now."""
+        return cls(location, now.astimezone(pytz.timezone(location.timezone)).date(), ephemeris)
+
+    def local_time(self, now):
+        return now.astimezone(self.tz)
+
+    def covers(self, now):
+        """Return True if now falls on the day this timeline was built for."""
+        return self.local_time(now).date() == self.date
+
+    def colors_at(self, now):
+        """Return the (top, bottom) sky colors for the minute containing now."""
+        # Elapsed minutes rather than the wall-clock minute, which is off by an hour after a DST change
+        minute = min(max(int((now.timestamp() - self.midnight) // 60), 0), len(self.top) - 1)
+        return tuple(self.top[minute].tolist()), tuple(self.bottom[minute].tolist())
+
+
+def _local_midnight(tz, date):
+    return tz.localize(datetime.datetime.combine(date, datetime.time())).timestamp()
+
+
+def _sky_colors(timestamps, sunrise, sunset):
+    """Vectorized sky_color_at for an array of POSIX timestamps, as uint8 RGB rows.
+
+    The sky colors are piecewise linear between the dawn and dusk key points,
+    so every channel is a single np.interp over those points.
+    """
+    knots = np.array([sunrise - 45 * 60, sunrise, sunrise + 30 * 60, sunset - 30 * 60, sunset, sunset + 45 * 60])
+    if np.any(np.diff(knots) <= 0):
+        # Sun times too close together for the key points to line up, fall back to the scalar version
+        utc = datetime.timezone.utc
+        colors = [sky_color_at(datetime.datetime.fromtimestamp(t, utc), datetime.datetime.fromtimestamp(sunrise, utc),
+                               datetime.datetime.fromtimestamp(sunset, utc)) for t in timestamps]
+        return np.array(colors, dtype=np.uint8)
+    keys = np.array([COLOR_NIGHT, COLOR_DAWN, COLOR_DAY, COLOR_DAY, COLOR_SUNSET, COLOR_NIGHT], dtype=np.float64)
+    channels = [np.interp(timestamps, knots, keys[:, channel]) for channel in range(3)]
+    return np.trunc(np.stack(channels, axis=1)).astype(np.uint8)
+
+
+class GradientCache:
+    """Small LRU cache of prebuilt vertical gradient surfaces.
+
+    Gradients are keyed by (top_color, bottom_color, size, step) and built once
+    with a vectorized NumPy fill, so drawing the sky is a single blit per frame.
+    """
+
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self._surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, top_color, bottom_color, size, step=1):
+        key = (tuple(top_color), tuple(bottom_color), tuple(size), step)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = build_gradient_surface(top_color, bottom_color, size, step)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self._surfaces.clear()
+
+
+def build_gradient_surface(top_color, bottom_color, size, step=1):
+    """Build a surface holding a vertical gradient from top_color to bottom_color.
+
+    Matches the per-scanline interpolation (truncated toward zero) of the
+    original line-by-line renderer.  With step above 1 only every step-th
+    scanline is interpolated and stretched over the ones below it, in bands.
+    """
+    width, height = size
+    top = np.asarray(top_color[:3], dtype=np.float64)
+    bottom = np.asarray(bottom_color[:3], dtype=np.float64)
+    factors = np.arange(0, height, step, dtype=np.float64)[:, None] / height
+    rows = np.trunc(top + (bottom - top) * factors).astype(np.uint8)
+    # Every column is the same, so build a single one and let pygame stretch it
+    column = pygame.surfarray.make_surface(rows[None, :, :])
+    surface = pygame.transform.scale(column, size)
+    if pygame.display.get_init() and pygame.display.get_surface() is not None:
+        surface = surface.convert()
+    return surface
+
+
+gradient_cache = GradientCache()
+
+
+def draw_background_gradient(surface, screen_height, screen_width, top_color, bottom_color, step=1):
+    """Draw a vertical gradient from top_color to bottom_color, computing every step-th scanline."""
+    gradient = gradient_cache.get(top_color, bottom_color, (screen_width, screen_height), step)
+    surface.blit(gradient, (0, 0))
 
 # def draw_starry_sky(screen, width, height, star_count=100):
 #     #screen.fill((10, 10, 30))  # dark night blue
@@ -96,18 +216,14 @@ def draw_background_gradient(surface, screen_height, screen_width, top_color, bo
 
     #screen.blit(cloud_surface, (0, 0))
 
-def draw_cloudy_night(screen, width, height, clouds):
+def draw_cloudy_night(screen, width, height, clouds, dt=1 / 60):
+    """Advance and draw a particles.CloudField, returning the rects it covers."""
     #screen.fill((20, 20, 40))  # base night color
-    cloud_surface = pygame.Surface((width, height), pygame.SRCALPHA)
-    
-    for cloud in clouds:
-        cloud.update(width)
-        cloud.draw(cloud_surface)
-
-    screen.blit(cloud_surface, (0, 0))
+    clouds.update(dt)
+    return clouds.draw(screen)
 
-def draw_starry_sky(screen, width, height, stars):
+def draw_starry_sky(screen, width, height, stars, dt=1 / 60):
+    """Advance and draw a particles.StarField, returning the rects it covers."""
     #screen.fill((10, 10, 30))  # deep night sky
-    for star in stars:
-        star.update()
-        star.draw(screen)
+    stars.update(dt)
+    return stars.draw(screen)
@@ -0,0 +1,214 @@
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Keep stdout clean for the JSON report
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+import pytz
+import typer
+from astral import LocationInfo
+from background import SkyTimeline, gradient_cache
+from icons import ICON_CODES, IconAtlas
+from main import ClockScene
+from text import text_cache
+from util import setup_headless_display
+
+app = typer.Typer()
+
+# Fixed location and day so every run renders the same sky
+LOCATION = LocationInfo("Baltimore", "United States", "America/New_York", 39.290385, -76.612189)
+DATE = datetime.date(2025, 6, 21)
+
+# Scene name -> (time of day, weather condition, description, icon code)
+SCENES = {
+    "day": ("noon", "clear", "clear sky", "01d"),
+    "dawn": ("dawn", "clear", "clear sky", "01d"),
+    "dusk": ("dusk", "clear", "clear sky", "01n"),
+    "clear_night": ("night", "clear", "clear sky", "01n"),
+    "cloudy_night": ("night", "clouds", "overcast clouds", "04n"),
+    "rain": ("night", "rain", "moderate rain", "10n"),
+}
+
+
+
+def scene_stages(scene):
+    """The stages timed for scene: each compositor layer, back to front, then composing."""
+    return [layer.name for layer in scene.compositor.layers] + ["present"]
+
+
+def scene_time(moment, sky_timeline):
+    """Return the fixture datetime for a named time of day."""
+    tz = pytz.timezone(LOCATION.timezone)
+    if moment == "noon":
+        return tz.localize(datetime.datetime.combine(DATE, datetime.time(12, 0)))
+    if moment == "dawn":
+        return sky_timeline.sunrise - datetime.timedelta(minutes=20)
+    if moment == "dusk":
+        return sky_timeline.sunset + datetime.timedelta(minutes=20)
+    return tz.localize(datetime.datetime.combine(DATE, datetime.time(23, 30)))
+
+
+def weather_fixture(condition, description, icon):
+    report = {"weather": condition, "description": description, "icon": icon, "image_url": ""}
+    return 71.2, 70.1, 1012, 40, 3.4, "NNE", (report,)
+
+
+def icon_fixture(cache_dir):
+    """Write a placeholder PNG for every icon code so the atlas never touches the network."""
+    icon = pygame.Surface((100, 100), pygame.SRCALPHA)
+    pygame.draw.circle(icon, (250, 200, 40, 255), (50, 50), 40)
+    atlas = IconAtlas(cache_dir=cache_dir)
+    for code in ICON_CODES:
+        pygame.image.save(icon, str(atlas.path(code)))
+    return atlas
+
+
+def _percentiles(values):
+    values = np.asarray(values) * 1000
+    return {"p50": round(float(np.percentile(values, 50)), 4),
+            "p90": round(float(np.percentile(values, 90)), 4),
+            "p99": round(float(np.percentile(values, 99)), 4),
+            "max": round(float(values.max()), 4)}
+
+
+def _render_count(scene):
+    return text_cache.renders + gradient_cache.misses + scene.moon_renderer.renders
+
+
+def run_scene(name, screen, icon_atlas, frames=300, fps=30):
+    """Render a scene for a number of simulated frames and return its measurements.
+
+    Time advances by 1/fps per frame, so the clock ticks over every fps frames
+    just as it does on the panel.  A second pass repeats the run under
+    tracemalloc to measure allocations without skewing the timings.
+    """
+    moment, condition, description, icon = SCENES[name]
+    sky_timeline = SkyTimeline(LOCATION, DATE)
+    start = scene_time(moment, sky_timeline)
+    dt = 1 / fps
+
+    def run(measure):
+        scene = ClockScene(screen, LOCATION, icon_atlas, start)
+        scene.set_weather(weather_fixture(condition, description, icon))
+        scene.compositor.profile = True
+        for frame in range(frames):
+            measure(scene, start + datetime.timedelta(seconds=frame * dt), dt)
+
+    stage_times = {}
+    totals = []
+    renders = []
+
+    def timed(scene, now, dt):
+        rendered = _render_count(scene)
+        begin = time.perf_counter()
+        scene.update(now, dt)
+        scene.present()
+        totals.append(time.perf_counter() - begin)
+        renders.append(_render_count(scene) - rendered)
+        for stage in scene_stages(scene):
+            stage_times.setdefault(stage, []).append(scene.compositor.timings.get(stage, 0.0))
+
+    run(timed)
+
+    allocated = []
+
+    def traced(scene, now, dt):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        scene.update(now, dt)
+        scene.present()
+        allocated.append(tracemalloc.get_traced_memory()[1] - before)
+
+    tracemalloc.start()
+    try:
+        run(traced)
+    finally:
+        tracemalloc.stop()
+
+    # The first frame builds every cache, report it apart from the steady state
+    steady = slice(1, None)
+    return {
+        "frames": frames,
+        "fps": fps,
+        "first_frame_ms": round(totals[0] * 1000, 4),
+        "total_ms": _percentiles(totals[steady]),
+        "stages_ms": {stage: _percentiles(times[steady]) for stage, times in stage_times.items()},
+        "alloc_bytes_per_frame": {"p50": int(np.percentile(allocated[steady], 50)), "max": int(max(allocated[steady]))},
+        "renders_per_frame": round(float(np.mean(renders[steady])), 4),
+    }
+
+
+def run_benchmarks(width=800, height=480, frames=300, fps=30, scenes=None):
+    """Run every requested scene headless and return the results as a JSON-ready dict."""
+    screen = setup_headless_display(width, height)
+    results = {"resolution": [width, height], "scenes": {}}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        icon_atlas = icon_fixture(Path(cache_dir))
+        for name in scenes or SCENES:
+            results["scenes"][name] = run_scene(name, screen, icon_atlas, frames, fps)
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25):
+    """Return a list of regressions of results against a baseline run.
+
+    A scene regresses when its p50 or p99 frame time is more than tolerance
+    slower than the baseline, or when it renders more per frame.
+    """
+    regressions = []
+    for name, expected in baseline.get("scenes", {}).items():
+        actual = results["scenes"].get(name)
+        if actual is None:
+            continue
+        for percentile in ("p50", "p99"):
+            limit = expected["total_ms"][percentile] * (1 + tolerance)
+            if actual["total_ms"][percentile] > limit:
+                regressions.append(f"{name}: {percentile} frame time {actual['total_ms'][percentile]:.3f} ms "
+                                   f"exceeds baseline {expected['total_ms'][percentile]:.3f} ms by more than {tolerance:.0%}")
+        if actual["renders_per_frame"] > expected["renders_per_frame"]:
+            regressions.append(f"{name}: {actual['renders_per_frame']} renders per frame, baseline {expected['renders_per_frame']}")
+    return regressions
+
+
+@app.command()
+def bench(
+    width: int = typer.Option(800, help="Panel width to render at"),
+    height: int = typer.Option(480, help="Panel height to render at"),
+    frames: int = typer.Option(300, help="Frames to render per scene"),
+    fps: int = typer.Option(30, help="Simulated frame rate"),
+    scene: list[str] = typer.Option(None, help=f"Scene to run, repeatable (default all: {', '.join(SCENES)})"),
+    output: Path = typer.Option(None, help="Write the JSON results to this file"),
+    baseline: Path = typer.Option(None, help="Baseline JSON to compare against"),
+    tolerance: float = typer.Option(0.25, help="Allowed slowdown against the baseline, 0.25 = 25%"),
+):
+    """
+    Render every scene headless and report frame times as JSON
+    """
+    unknown = [name for name in scene or [] if name not in SCENES]
+    if unknown:
+        raise typer.BadParameter(f"Unknown scene {', '.join(unknown)}")
+
+    results = run_benchmarks(width, height, frames, fps, scene)
+    report = json.dumps(results, indent=2)
+    if output:
+        output.write_text(report)
+    print(report)
+
+    if baseline:
+        regressions = compare_to_baseline(results, json.loads(baseline.read_text()), tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,63 @@
+import datetime
+import time
+
+
+class SystemClock:
+    """The wall clock, which the clock normally runs on."""
+
+    def time(self):
+        return time.time()
+
+    def now(self, tz=None):
+        """The current time as an aware datetime in tz, UTC by default."""
+        return datetime.datetime.fromtimestamp(self.time(), tz or datetime.timezone.utc)
+
+
+class WarpClock(SystemClock):
+    """Simulated time that starts at start and only moves when advanced.
+
+    speed is how many simulated seconds pass per real second; a WarpScheduler
+    advances the clock by that many seconds times each frame interval, so a
+    run is the same from one start to the next whatever the host's speed.
+    """
+
+    def __init__(self, start, speed=720.0):
+        self.start = start
+        self.speed = speed
+        self._time = start.timestamp()
+
+    def time(self):
+        return self._time
+
+    def advance(self, seconds):
+        self._time += seconds
+
+
+class WarpScheduler:
+    """Frame pacing for a WarpClock, a drop-in for scheduler.FrameScheduler.
+
+    Every frame is 1 / max_fps real seconds long and moves the simulated
+    clock on by speed times that, so a day at speed 720 takes two minutes.
+    Animations still get the real frame interval as their time step, which
+    keeps drifting clouds and falling rain at their normal pace while the
+    sky runs through the day.  With realtime off frames are not slept for at
+    all, for soak runs that should go as fast as the host can render.
+    """
+
+    def __init__(self, clock, max_fps=30, realtime=True, sleep=time.sleep):
+        self.clock = clock
+        self.max_fps = max_fps
+        self.realtime = realtime
+        self.sleep = sleep
+        self._last_frame = time.perf_counter()
+
+    def wait(self, animating):
+        """Advance the simulated clock by one frame and return the frame interval."""
+        interval = 1 / self.max_fps
+        if self.realtime:
+            delay = self._last_frame + interval - time.perf_counter()
+            if delay > 0:
+                self.sleep(delay)
+        self._last_frame = time.perf_counter()
+        self.clock.advance(interval * self.clock.speed)
+        return interval
@@ -1,19 +1,69 @@
+import numpy as np
 import pygame
 
+CLOUD_COLOR = (100, 100, 120)
+
 class Cloud:
-    def __init__(self, x, y, w, h, alpha, speed_x=0.1):
+    def __init__(self, x, y, w, h, alpha, speed_x=6):
         self.x = x
         self.y = y
         self.w = w
         self.h = h
         self.alpha = alpha
-        self.speed_x = speed_x  # slow horizontal movement
+        self.speed_x = speed_x  # slow horizontal movement, in pixels per second
+        self.sprite = None
 
-    def update(self, width):
-        self.x += self.speed_x
+    def update(self, width, dt=1 / 60):
+        self.x += self.speed_x * dt
         if self.x > width:
             self.x = -self.w  # wrap around to left
 
     def draw(self, surface):
-        color = (100, 100, 120, self.alpha)
-        pygame.draw.ellipse(surface, color, (self.x, self.y, self.w, self.h))
+        # The soft sprite is rendered once and then only blitted
+        if self.sprite is None:
+            self.sprite = render_cloud_sprite(self.w, self.h, self.alpha)
+        return surface.blit(self.sprite, (int(self.x), int(self.y)))
+
+
+def cloud_puffs(w, h, rng, count=None):
+    """Return random puffs for a lumpy cloud of size w x h as rows of (x, y, radius x, radius y).
+
+    The puffs sit along the cloud's base and stay inside its bounding box, so
+    a sprite of size w x h holds the whole cloud.
+    """
+    count = count if count is not None else int(rng.integers(3, 6))
+    rx = w / (count + 1)
+    ry = rng.uniform(0.35, 0.5, count) * h
+    x = np.linspace(rx, w - rx, count) + rng.uniform(-0.25, 0.25, count) * rx
+    y = h - ry - rng.uniform(0, 0.1, count) * h
+    return np.column_stack([x, y, np.full(count, rx), ry])
+
+
+def render_cloud_sprite(w, h, alpha, color=CLOUD_COLOR, puffs=None, offset=0.0):
+    """Render a soft-edged cloud sprite of w x h pixels with per-pixel alpha.
+
+    The cloud is a wide base ellipse plus optional puffs, each adding a
+    density that falls off smoothly to zero at its edge, so the sprite comes
+    out blurred without a separate blur pass.  offset shifts the cloud right
+    by a fraction of a pixel, which lets callers keep a few sub-pixel
+    variants of the same cloud for smooth slow drift.
+    """
+    w, h = int(w), int(h)
+    shapes = [(w / 2, h / 2, w / 2, h / 2)]
+    if puffs is not None:
+        shapes += [tuple(puff) for puff in puffs]
+    xs = np.arange(w)[:, None] + 0.5 - offset
+    ys = np.arange(h)[None, :] + 0.5
+    density = np.zeros((w, h))
+    for cx, cy, rx, ry in shapes:
+        distance = ((xs - cx) / rx) ** 2 + ((ys - cy) / ry) ** 2
+        density += np.clip(1 - distance, 0, 1) ** 2
+    coverage = np.clip(density * 1.5, 0, 1)
+    coverage = coverage * coverage * (3 - 2 * coverage)
+
+    sprite = pygame.Surface((w, h), pygame.SRCALPHA)
+    sprite.fill((*color, 0))
+    pixels = pygame.surfarray.pixels_alpha(sprite)
+    pixels[:] = (coverage * alpha).astype(np.uint8)
+    del pixels
+    return sprite
@@ -0,0 +1,176 @@
+import time
+import pygame
+
+
+class Layer:
+    """A cached surface holding one part of the scene.
+
+    Static layers are redrawn only after invalidate() is called.  Animated
+    layers are redrawn every frame; their render function must return the
+    rects it drew so that only those regions are cleared and pushed to the
+    display on the next frame.
+    """
+
+    def __init__(self, name, size, render, opaque=False, animated=False):
+        self.name = name
+        self.render = render
+        self.opaque = opaque
+        self.animated = animated
+        self.visible = True
+        if opaque:
+            self.surface = pygame.Surface(size)
+        else:
+            self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert() if opaque else self.surface.convert_alpha()
+        self.invalid = True
+        self._drawn_rects = []
+        self._shown = False
+
+    def invalidate(self):
+        self.invalid = True
+
+    def set_visible(self, visible):
+        self.visible = visible
+
+    def is_active(self):
+        """Return True while an animated layer is showing something that moves."""
+        return self.visible and self.animated and bool(self._drawn_rects)
+
+    def update(self):
+        """Redraw the layer if needed and return the screen rects it changed."""
+        changed = []
+        if self._shown != self.visible:
+            if self._shown:
+                changed.extend(self._drawn_rects)
+            self._shown = self.visible
+            self.invalid = True
+
+        if not self.visible or not (self.invalid or self.animated):
+            return changed
+
+        if self.animated:
+            # Only erase what the previous frame drew
+            for rect in self._drawn_rects:
+                self.surface.fill((0, 0, 0, 0), rect)
+            changed.extend(self._drawn_rects)
+            drawn = self.render(self.surface)
+            if drawn is None:
+                drawn = [self.surface.get_rect()]
+            self._drawn_rects = [pygame.Rect(rect) for rect in drawn]
+        else:
+            changed.extend(self._drawn_rects)
+            if not self.opaque:
+                self.surface.fill((0, 0, 0, 0))
+            self.render(self.surface)
+            if self.opaque:
+                self._drawn_rects = [self.surface.get_rect()]
+            else:
+                self._drawn_rects = [self.surface.get_bounding_rect()]
+
+        self.invalid = False
+        changed.extend(self._drawn_rects)
+        return changed
+
+
+class Compositor:
+    """Compose layers onto the screen, updating only the regions that changed.
+
+    Layers are blitted back to front into each dirty rect, then only those
+    rects are sent to the display with pygame.display.update.  When the dirty
+    area covers most of the screen a full flip is cheaper and used instead.
+    Setting output to a callable taking (screen, rects) sends frames there
+    instead of the display, with rects None for a full frame.
+    """
+
+    def __init__(self, screen, full_update_ratio=0.5):
+        self.screen = screen
+        self.full_update_ratio = full_update_ratio
+        self.layers = []
+        self._full_redraw = True
+        # When profile is set, present() records seconds spent per layer and in "present"
+        self.profile = False
+        self.timings = {}
+        self.output = None
+
+    def add_layer(self, name, render, opaque=False, animated=False):
+        layer = Layer(name, self.screen.get_size(), render, opaque, animated)
+        self.layers.append(layer)
+        return layer
+
+    def animating(self):
+        return any(layer.is_active() for layer in self.layers)
+
+    def invalidate_all(self):
+        """Force the next present() to redraw and push the whole screen."""
+        for layer in self.layers:
+            layer.invalidate()
+        self._full_redraw = True
+
+    def force_full_update(self):
+        """Compose and push the whole screen on the next present(), redrawing only the layers that need it."""
+        self._full_redraw = True
+
+    def present(self):
+        """Update every layer, compose the dirty regions and push them to the display.
+
+        Returns the list of rects that were updated.
+        """
+        screen_rect = self.screen.get_rect()
+        dirty = []
+        if self.profile:
+            for layer in self.layers:
+                start = time.perf_counter()
+                dirty.extend(layer.update())
+                self.timings[layer.name] = time.perf_counter() - start
+            start = time.perf_counter()
+            dirty = self._compose(dirty, screen_rect)
+            self.timings["present"] = time.perf_counter() - start
+            return dirty
+
+        for layer in self.layers:
+            dirty.extend(layer.update())
+        return self._compose(dirty, screen_rect)
+
+    def _compose(self, dirty, screen_rect):
+
+        if self._full_redraw:
+            dirty = [screen_rect]
+        else:
+            dirty = _merge_rects(dirty, screen_rect)
+            area = sum(rect.width * rect.height for rect in dirty)
+            if area > screen_rect.width * screen_rect.height * self.full_update_ratio:
+                dirty = [screen_rect]
+
+        if not dirty:
+            return dirty
+
+        for rect in dirty:
+            for layer in self.layers:
+                if layer.visible:
+                    self.screen.blit(layer.surface, rect, rect)
+
+        full = self._full_redraw or dirty[0] == screen_rect
+        if self.output is not None:
+            self.output(self.screen, None if full else dirty)
+        elif full:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
+        self._full_redraw = False
+        return dirty
+
+
+def _merge_rects(rects, bounds):
+    """Clip rects to bounds, dropping empty ones and merging overlaps."""
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect).clip(bounds)
+        if not rect.width or not rect.height:
+            continue
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
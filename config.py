@@ -0,0 +1,111 @@
+import os
+import threading
+from types import SimpleNamespace
+import pytz
+from util import get_config
+
+# Seconds between checks of the config file, each check is a single stat()
+POLL_INTERVAL = 2.0
+# Tier settings the config file may override, see quality.QUALITY_TIERS
+EFFECT_KEYS = ("stars", "clouds", "precipitation", "clock_glow", "text_glow", "gradient_step")
+
+
+def merge_settings(defaults, config):
+    """Lay the settings of a config loaded by util.get_config over defaults and check them.
+
+    Only keys in defaults can be set.  Nested objects are merged key by key,
+    so a file can change one font size and keep the others.  Raises
+    ValueError for a setting the clock cannot use.
+    """
+    if not isinstance(config, SimpleNamespace):
+        raise ValueError("expected a JSON object")
+    settings = dict(defaults)
+    for key, value in vars(config).items():
+        if key not in defaults:
+            raise ValueError(f"unknown setting {key!r}, expected one of {', '.join(defaults)}")
+        if isinstance(defaults[key], dict):
+            if not isinstance(value, SimpleNamespace):
+                raise ValueError(f"{key} must be an object")
+            value = {**defaults[key], **vars(value)}
+        elif not isinstance(value, type(defaults[key])) or isinstance(value, bool) != isinstance(defaults[key], bool):
+            raise ValueError(f"{key} must be a {type(defaults[key]).__name__}, got {value!r}")
+        settings[key] = value
+    try:
+        pytz.timezone(settings["timezone"])
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"unknown timezone {settings['timezone']!r}")
+    for name, size in settings["font_sizes"].items():
+        if name not in defaults["font_sizes"]:
+            raise ValueError(f"unknown font size {name!r}, expected one of {', '.join(defaults['font_sizes'])}")
+        # JSON true and false load as bool, which isinstance also takes for an int
+        if isinstance(size, bool) or not isinstance(size, (int, float)) or not 0 < size <= 1:
+            raise ValueError(f"font size {name} must be a share of the screen height between 0 and 1")
+    for name, value in settings["effects"].items():
+        if name not in EFFECT_KEYS:
+            raise ValueError(f"unknown effect {name!r}, expected one of {', '.join(EFFECT_KEYS)}")
+        if isinstance(value, bool) or not isinstance(value, int if name != "precipitation" else (int, float)) or value < 0:
+            raise ValueError(f"effect {name} must be a {'number' if name == 'precipitation' else 'whole number'} of at least 0")
+    return settings
+
+
+class ConfigWatcher:
+    """Settings from a JSON config file, reloaded when the file changes.
+
+    defaults holds every setting the file may set, taken from the command
+    line, and a setting missing from the file keeps its default.  A
+    background thread stats the file every interval seconds and only reads
+    it when its modification time or size changed.  A file that does not
+    parse or holds a bad setting is reported and the last good settings are
+    kept, so a half-saved edit never takes the clock down.  New settings are
+    published by replacing `settings` and bumping `version`, which the
+    render loop polls.
+    """
+
+    def __init__(self, path, defaults, interval=POLL_INTERVAL):
+        self.path = path
+        self.defaults = defaults
+        self.interval = interval
+        self.settings = dict(defaults)
+        self.version = 0
+        self._stamp = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def load(self):
+        """Read the file if it changed since the last look, returning True if the settings changed."""
+        try:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamp = None
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        if stamp is None:
+            print(f"Config file {self.path} not found, using the command line settings")
+            settings = dict(self.defaults)
+        else:
+            try:
+                settings = merge_settings(self.defaults, get_config(self.path))
+            except (OSError, ValueError) as e:
+                print(f"Ignoring config file {self.path}: {e}")
+                return False
+        if settings == self.settings:
+            return False
+        self.settings = settings
+        self.version += 1
+        print(f"Loaded settings from {self.path}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.load()
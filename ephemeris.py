@@ -0,0 +1,264 @@
+import datetime
+import math
+import multiprocessing
+import os
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytz
+
+# One row per local day; event times are POSIX timestamps, NaN when the event does not happen that day
+EPHEMERIS_DTYPE = np.dtype([
+    ("midnight", "<f8"),
+    ("sunrise", "<f8"),
+    ("sunset", "<f8"),
+    ("civil_dawn", "<f8"),
+    ("civil_dusk", "<f8"),
+    ("nautical_dawn", "<f8"),
+    ("nautical_dusk", "<f8"),
+    ("moonrise", "<f8"),
+    ("moonset", "<f8"),
+    ("moon_illumination", "<f8"),  # At local midnight
+])
+
+# File header: magic, format version, latitude, longitude, first day (proleptic ordinal), day count, timezone
+EPHEMERIS_MAGIC = b"EPHM"
+EPHEMERIS_HEADER = struct.Struct("<4sB3xddII40s")
+TABLE_DAYS = 366
+# Start building next year's table once fewer days than this are left
+REFRESH_DAYS = 30
+# How the table is built in a child process: forkserver where there is one, spawn elsewhere
+BUILD_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def table_path(directory, location):
+    """The table file for location in directory, keyed by its rounded latitude and longitude."""
+    return os.path.join(directory, f"ephemeris_{location.latitude:+.3f}_{location.longitude:+.3f}.bin")
+
+
+def build_table(location, first_day, days=TABLE_DAYS):
+    """Compute days rows of sun and moon events for location, starting at the local date first_day.
+
+    The moon illumination is also computed for the midnight after the last
+    day, so the returned array has days + 1 rows and every day can be
+    interpolated to its end.
+    """
+    # The astronomy libraries are only needed here, which normally runs in a worker process
+    import ephem
+    from astral import moon
+    from astral.sun import dawn, dusk, sun
+
+    tz = pytz.timezone(location.timezone)
+    observer = location.observer
+    table = np.full(days + 1, np.nan, dtype=EPHEMERIS_DTYPE)
+
+    def timestamp(event, *args, **kwargs):
+        try:
+            found = event(observer, *args, **kwargs)
+        except ValueError:
+            return math.nan  # The sun or moon does not reach that altitude on this day
+        return found.timestamp() if found is not None else math.nan
+
+    for index in range(days + 1):
+        date = first_day + datetime.timedelta(days=index)
+        midnight = tz.localize(datetime.datetime.combine(date, datetime.time()))
+        row = table[index]
+        row["midnight"] = midnight.timestamp()
+        row["moon_illumination"] = ephem.Moon(ephem.Date(midnight.astimezone(pytz.utc).replace(tzinfo=None))).moon_phase
+        if index == days:
+            break
+        try:
+            events = sun(observer, date=date, tzinfo=tz)
+            row["sunrise"] = events["sunrise"].timestamp()
+            row["sunset"] = events["sunset"].timestamp()
+        except ValueError:
+            pass
+        row["civil_dawn"] = timestamp(dawn, date=date, depression=6, tzinfo=tz)
+        row["civil_dusk"] = timestamp(dusk, date=date, depression=6, tzinfo=tz)
+        row["nautical_dawn"] = timestamp(dawn, date=date, depression=12, tzinfo=tz)
+        row["nautical_dusk"] = timestamp(dusk, date=date, depression=12, tzinfo=tz)
+        row["moonrise"] = timestamp(moon.moonrise, date, tz)
+        row["moonset"] = timestamp(moon.moonset, date, tz)
+    return table
+
+
+def write_table(path, location, first_day, days=TABLE_DAYS):
+    """Build the table for location and write it to path, replacing any old file atomically."""
+    table = build_table(location, first_day, days)
+    header = EPHEMERIS_HEADER.pack(EPHEMERIS_MAGIC, 1, location.latitude, location.longitude,
+                                   first_day.toordinal(), days, location.timezone.encode("utf-8"))
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(header)
+        file.write(table.tobytes())
+    os.replace(temp_path, path)
+    return path
+
+
+class EphemerisTable:
+    """Sun and moon events for one location, usually a year memory-mapped from a table file.
+
+    Rows are local days, so finding a day's events is an index computed from
+    its date and the moon's illumination between two midnights is a linear
+    interpolation.  Nothing is computed at lookup time.  rows holds one
+    more row than days, for the midnight after the last day.
+    """
+
+    def __init__(self, rows, first_day, latitude, longitude, timezone):
+        self.rows = rows
+        self.days = len(rows) - 1
+        self.first_day = first_day
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timezone = timezone
+        self.tz = pytz.timezone(timezone)
+
+    @classmethod
+    def read(cls, path):
+        """Map the table file at path, raising ValueError if it is not one."""
+        with open(path, "rb") as file:
+            header = file.read(EPHEMERIS_HEADER.size)
+        if len(header) < EPHEMERIS_HEADER.size:
+            raise ValueError(f"{path} is not an ephemeris table")
+        magic, version, latitude, longitude, first_ordinal, days, timezone = EPHEMERIS_HEADER.unpack(header)
+        if magic != EPHEMERIS_MAGIC or version != 1:
+            raise ValueError(f"{path} is not an ephemeris table")
+        rows = np.memmap(path, dtype=EPHEMERIS_DTYPE, mode="r", offset=EPHEMERIS_HEADER.size, shape=(days + 1,))
+        return cls(rows, datetime.date.fromordinal(first_ordinal), latitude, longitude,
+                   timezone.rstrip(b"\0").decode("utf-8"))
+
+    @classmethod
+    def from_dict(cls, data):
+        rows = np.array([tuple(row) for row in data["rows"]], dtype=EPHEMERIS_DTYPE)
+        return cls(rows, datetime.date.fromisoformat(data["first_day"]), data["latitude"], data["longitude"],
+                   data["timezone"])
+
+    def to_dict(self):
+        """The table as JSON-friendly values, with NaN for the events that do not happen."""
+        return {"first_day": self.first_day.isoformat(), "latitude": self.latitude, "longitude": self.longitude,
+                "timezone": self.timezone, "rows": self.rows.tolist()}
+
+    def window(self, first_day, days):
+        """Return an in-memory table of up to days days from first_day, or None if none of them are covered."""
+        start = max((first_day - self.first_day).days, 0)
+        end = min((first_day - self.first_day).days + days, self.days)
+        if start >= end:
+            return None
+        return EphemerisTable(np.array(self.rows[start:end + 1]), self.first_day + datetime.timedelta(days=start),
+                              self.latitude, self.longitude, self.timezone)
+
+    @classmethod
+    def open(cls, path):
+        """Open the table at path, or return None if it is missing or unreadable."""
+        try:
+            return cls.read(path)
+        except (OSError, ValueError) as e:
+            if os.path.exists(path):
+                print(f"Ignoring ephemeris table {path}: {e}")
+            return None
+
+    def matches(self, location):
+        return (round(self.latitude, 3) == round(location.latitude, 3)
+                and round(self.longitude, 3) == round(location.longitude, 3)
+                and self.timezone == location.timezone)
+
+    def local_date(self, now):
+        return now.astimezone(self.tz).date()
+
+    def days_left(self, date):
+        return (self.first_day - date).days + self.days
+
+    def covers(self, date):
+        return 0 <= (date - self.first_day).days < self.days
+
+    def day(self, date):
+        """Return the row for the local date, or None if the table does not cover it."""
+        if not self.covers(date):
+            return None
+        return self.rows[(date - self.first_day).days]
+
+    def event(self, date, name):
+        """Return the time of event name on the local date as an aware datetime, or None."""
+        row = self.day(date)
+        if row is None or math.isnan(row[name]):
+            return None
+        return datetime.datetime.fromtimestamp(float(row[name]), self.tz)
+
+    def sun_times(self, date):
+        """Return (sunrise, sunset) on the local date, or None when not covered or the sun does not rise."""
+        sunrise = self.event(date, "sunrise")
+        sunset = self.event(date, "sunset")
+        if sunrise is None or sunset is None:
+            return None
+        return sunrise, sunset
+
+    def moon_state(self, now):
+        """Return the moon's (illumination, waxing) at now, or None if the table does not cover it."""
+        index = (self.local_date(now) - self.first_day).days
+        if not 0 <= index < self.days:
+            return None
+        start, end = self.rows[index], self.rows[index + 1]
+        span = end["midnight"] - start["midnight"]
+        factor = (now.timestamp() - start["midnight"]) / span
+        illumination = start["moon_illumination"] + (end["moon_illumination"] - start["moon_illumination"]) * factor
+        return float(illumination), bool(end["moon_illumination"] > start["moon_illumination"])
+
+
+class EphemerisStore:
+    """Keep an ephemeris table for the current location, building it in a worker process.
+
+    load() maps the table saved by an earlier run, which is immediate.
+    refresh() builds a new one in a separate process when there is no
+    table for the location or it runs out within REFRESH_DAYS, so the
+    astronomy never competes with the render loop for the interpreter.  A
+    finished table is published by replacing `table` and bumping `version`,
+    which the render loop polls.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.table = None
+        self.version = 0
+        self._building = None
+        self._lock = threading.Lock()
+
+    def load(self, location):
+        """Map the saved table for location, returning it or None."""
+        table = EphemerisTable.open(table_path(self.directory, location))
+        if table is not None and not table.matches(location):
+            table = None
+        self.table = table
+        return table
+
+    def refresh(self, location, now=None):
+        """Start building a table for location in the background if the current one will not do."""
+        if now is None:
+            now = datetime.datetime.now(datetime.timezone.utc)
+        today = now.astimezone(pytz.timezone(location.timezone)).date()
+        table = self.table
+        if table is not None and table.matches(location) and table.days_left(today) > REFRESH_DAYS:
+            return False
+        with self._lock:
+            if self._building == (location, today):
+                return False
+            self._building = (location, today)
+        threading.Thread(target=self._build, args=(location, today), name="ephemeris", daemon=True).start()
+        return True
+
+    def _build(self, location, today):
+        path = table_path(self.directory, location)
+        try:
+            # Forking this process would copy the other threads' locks in whatever state they are in
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(BUILD_START_METHOD)) as pool:
+                pool.submit(write_table, path, location, today).result()
+            table = EphemerisTable.read(path)
+        except Exception as e:
+            print(f"Failed to build the ephemeris table: {e}")
+            return
+        finally:
+            with self._lock:
+                self._building = None
+        self.table = table
+        self.version += 1
+        print(f"Ephemeris table for {location.name} ready, {table.days} days from {table.first_day}")
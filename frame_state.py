@@ -0,0 +1,145 @@
+TIME_FORMAT = "%H:%M:%S"
+DATE_FORMAT = "%A, %B %d, %Y"
+
+
+class FrameState:
+    """Formatted strings and text layout of the clock, derived only when their inputs change.
+
+    set_time() is called every frame but only formats anything when the
+    second changes, and the date only when the day changes.  The weather
+    strings are built in set_weather().  The layout is computed on first use
+    after a change and every string is measured only when it changes, so
+    frames between second ticks do no formatting or font metrics work.
+    measure_clock, if given, measures the clock line instead of its font,
+    such as DigitAtlas.size for a clock drawn from an atlas.  reserve is the
+    height kept free under the text, see calculate_text_positions.
+    """
+
+    def __init__(self, screen_size, clock_font, date_font, weather_font, weather_det_font, measure_clock=None,
+                 reserve=0):
+        self.screen_size = screen_size
+        self.reserve = reserve
+        self.fonts = {"clock": clock_font, "date": date_font, "weather": weather_font, "weather_det": weather_det_font}
+        self.measure_clock = measure_clock
+        self.second = None
+        self.day = None
+        self.time_str = ""
+        self.date_str = ""
+        self.weather_text, self.weather_det_text = weather_strings(None)
+        self._sizes = {}
+        self._positions = None
+
+    def set_fonts(self, clock_font, date_font, weather_font, weather_det_font):
+        """Switch to new fonts, measuring every line again."""
+        self.fonts = {"clock": clock_font, "date": date_font, "weather": weather_font, "weather_det": weather_det_font}
+        self._sizes = {}
+        self._positions = None
+
+    def set_time(self, now):
+        """Advance to now and return what changed: None, "second", "minute" or "day"."""
+        second = int(now.timestamp())
+        if second == self.second:
+            return None
+        self.second = second
+        time_str = now.strftime(TIME_FORMAT)
+        changed = "second" if time_str[:5] == self.time_str[:5] else "minute"
+        self.time_str = time_str
+        day = now.date()
+        if day != self.day:
+            self.day = day
+            self.date_str = now.strftime(DATE_FORMAT)
+            changed = "day"
+        self._positions = None
+        return changed
+
+    def set_weather(self, weather_data, weather_stale=False):
+        """Rebuild the weather strings, returning True if they changed."""
+        texts = weather_strings(weather_data, weather_stale)
+        if texts == (self.weather_text, self.weather_det_text):
+            return False
+        self.weather_text, self.weather_det_text = texts
+        self._positions = None
+        return True
+
+    @property
+    def positions(self):
+        """The layout from calculate_text_positions for the current strings."""
+        if self._positions is None:
+            self._positions = calculate_text_positions(self.screen_size, {
+                "clock": self._size("clock", self.time_str),
+                "date": self._size("date", self.date_str),
+                "weather": self._size("weather", self.weather_text),
+                "weather_det": self._size("weather_det", self.weather_det_text),
+            }, self.reserve)
+        return self._positions
+
+    def _size(self, name, text):
+        # Remember the last measurement per line, so only the line that changed is measured again
+        measured = self._sizes.get(name)
+        if measured is None or measured[0] != text:
+            measure = self.measure_clock if name == "clock" and self.measure_clock else self.fonts[name].size
+            measured = self._sizes[name] = (text, measure(text))
+        return measured[1]
+
+
+def weather_strings(weather_data, weather_stale=False):
+    """Return the weather and weather detail lines for weather_data.
+
+    Stale weather is flagged in the detail line.
+    """
+    temp = weather_data[0] if weather_data else None
+    if temp is None:
+        return "Weather Unavailable", ""
+    temp, feels_like, pressure, humidity, wind_speed, wind_deg, _ = weather_data
+    weather_text = f"{temp:.1f}°F, feels like {feels_like}°F"
+    weather_det_text = f"Humidity: {humidity}, Pressure: {pressure}, Wind {wind_speed} {wind_deg}"
+    if weather_stale:
+        weather_det_text += " (stale)"
+    return weather_text, weather_det_text
+
+
+def calculate_text_positions(screen_size, sizes, reserve=0):
+    """Calculate the positions for displaying text elements on the screen.
+
+    Determines the screen positions for the clock, date, and weather information
+    from the measured (width, height) of each line, centering them horizontally
+    and positioning them vertically with appropriate spacing.  "trends" is the
+    left edge and top of the row of trend charts under the text.  With a
+    reserve, the text moves up as far as the top of the screen to leave that
+    many pixels free for the trend charts.
+    """
+    screen_width, screen_height = screen_size
+    clock_text_width, clock_text_height = sizes["clock"]
+    date_text_width, date_text_height = sizes["date"]
+    weather_text_width, weather_text_height = sizes["weather"]
+    weather_det_text_width, weather_det_text_height = sizes["weather_det"]
+
+    clock_top = (screen_height - clock_text_height) // 3
+    if reserve:
+        text_height = clock_text_height + date_text_height + weather_text_height + weather_det_text_height + 3 * 20
+        clock_top = max(0, min(clock_top, screen_height - reserve - 10 - text_height))
+    clock_position = (
+        (screen_width - clock_text_width) // 2,
+        clock_top,
+    )
+    date_position = (
+        (screen_width - date_text_width) // 2,
+        clock_position[1] + clock_text_height + 20,
+    )
+    weather_position = (
+        (screen_width - weather_text_width) // 2,
+        date_position[1] + date_text_height + 20,
+    )
+    weather_det_position = (
+        (screen_width - weather_det_text_width) // 2,
+        weather_position[1] + weather_text_height + 20
+    )
+    trends_position = (0, weather_det_position[1] + weather_det_text_height + 10)
+
+    return {
+        "clock": clock_position,
+        "date": date_position,
+        "weather": weather_position,
+        "weather_det": weather_det_position,
+        "trends": trends_position,
+    }
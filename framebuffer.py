@@ -0,0 +1,115 @@
+import mmap
+import os
+import re
+import numpy as np
+import pygame
+from pathlib import Path
+
+# Framebuffer pixel formats this backend can write, by bits per pixel
+PIXEL_FORMATS = {16: "RGB565", 32: "XRGB8888"}
+
+
+class Framebuffer:
+    """Write frames straight into a Linux framebuffer device through mmap.
+
+    The clock renders to an off-screen surface (the SDL dummy driver), and
+    present() converts only the rows covered by the dirty rects to the
+    framebuffer's pixel format with NumPy and copies them into the mapped
+    memory, so no X server or SDL video driver is involved.
+
+    Geometry comes from /sys/class/graphics/<device> when path is a
+    framebuffer device.  Any other path, such as a regular file standing in
+    for the device, uses the given size and bits_per_pixel and is grown to
+    the frame size if it is smaller.
+    """
+
+    def __init__(self, path="/dev/fb0", size=(800, 480), bits_per_pixel=None):
+        self.path = Path(path)
+        width, height = size
+        stride = None
+        info = _sysfs_info(self.path)
+        if info:
+            width, height = info["size"]
+            bits_per_pixel = bits_per_pixel or info["bits_per_pixel"]
+            stride = info.get("stride")
+        self.bits_per_pixel = bits_per_pixel or 32
+        if self.bits_per_pixel not in PIXEL_FORMATS:
+            raise ValueError(f"Unsupported framebuffer depth {self.bits_per_pixel}, expected one of {sorted(PIXEL_FORMATS)}")
+        self.size = (width, height)
+        bytes_per_pixel = self.bits_per_pixel // 8
+        self.stride = stride or width * bytes_per_pixel
+        length = self.stride * height
+
+        self._file = open(self.path, "r+b" if self.path.exists() else "w+b")
+        if not info and os.fstat(self._file.fileno()).st_size < length:
+            self._file.truncate(length)
+        self._map = mmap.mmap(self._file.fileno(), length, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        dtype = np.dtype("<u2") if self.bits_per_pixel == 16 else np.dtype("<u4")
+        # One row per stride, trimmed to the visible width
+        rows = np.frombuffer(self._map, dtype=dtype).reshape(height, self.stride // bytes_per_pixel)
+        self.pixels = rows[:, :width]
+
+    @property
+    def pixel_format(self):
+        return PIXEL_FORMATS[self.bits_per_pixel]
+
+    def present(self, surface, rects=None):
+        """Copy the rows of surface touched by rects, or all of it, into the framebuffer."""
+        width = min(surface.get_width(), self.size[0])
+        height = min(surface.get_height(), self.size[1])
+        for top, bottom in _row_spans(rects, height):
+            self.pixels[top:bottom, :width] = self.convert(surface, top, bottom, width)
+
+    def convert(self, surface, top, bottom, width):
+        """Return rows top to bottom of surface in the framebuffer's pixel format, row-major."""
+        if surface.get_bytesize() == 4 and surface.get_shifts()[:3] == (16, 8, 0):
+            # Already XRGB in memory, the common case for display surfaces
+            pixels = pygame.surfarray.pixels2d(surface)
+            xrgb = pixels[:width, top:bottom].T.astype(np.uint32)
+            del pixels
+            if self.bits_per_pixel == 16:
+                return (xrgb >> 8 & 0xF800 | xrgb >> 5 & 0x07E0 | xrgb >> 3 & 0x001F).astype(np.uint16)
+            return xrgb & 0xFFFFFF
+        pixels = pygame.surfarray.pixels3d(surface)
+        rgb = pixels[:width, top:bottom].transpose(1, 0, 2).astype(np.uint32)
+        del pixels
+        red, green, blue = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+        if self.bits_per_pixel == 16:
+            return ((red >> 3) << 11 | (green >> 2) << 5 | blue >> 3).astype(np.uint16)
+        return red << 16 | green << 8 | blue
+
+    def close(self):
+        del self.pixels
+        self._map.close()
+        self._file.close()
+
+
+def _row_spans(rects, height):
+    """Merge the vertical extents of rects into sorted, non-overlapping (top, bottom) row spans."""
+    if rects is None:
+        return [(0, height)]
+    spans = []
+    for top, bottom in sorted((max(rect.top, 0), min(rect.bottom, height)) for rect in map(pygame.Rect, rects)):
+        if top >= bottom:
+            continue
+        if spans and top <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], bottom))
+        else:
+            spans.append((top, bottom))
+    return spans
+
+
+def _sysfs_info(path):
+    """Read a framebuffer device's geometry from sysfs, or return None for anything else."""
+    match = re.fullmatch(r"/dev/(fb\d+)", str(path))
+    if not match:
+        return None
+    sysfs = Path("/sys/class/graphics") / match.group(1)
+    try:
+        width, height = (int(value) for value in (sysfs / "virtual_size").read_text().strip().split(","))
+        info = {"size": (width, height), "bits_per_pixel": int((sysfs / "bits_per_pixel").read_text())}
+        if (sysfs / "stride").exists():
+            info["stride"] = int((sysfs / "stride").read_text())
+        return info
+    except (OSError, ValueError):
+        return None
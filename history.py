@@ -0,0 +1,110 @@
+import math
+import os
+import struct
+import time
+import numpy as np
+
+# One row per weather observation; the time is a POSIX timestamp, missing values are NaN
+HISTORY_DTYPE = np.dtype([
+    ("time", "<f8"),
+    ("temp", "<f4"),
+    ("feels_like", "<f4"),
+    ("pressure", "<f4"),
+    ("humidity", "<f4"),
+    ("wind_speed", "<f4"),
+])
+
+# File header: magic, format version, capacity in rows, observations ever written
+HISTORY_MAGIC = b"WHST"
+HISTORY_HEADER = struct.Struct("<4sB3xIQ")
+# A week of observations every five minutes, or three months of hourly ones
+HISTORY_CAPACITY = 2016
+
+
+class WeatherHistory:
+    """Recent weather observations in a fixed-size ring buffer memory-mapped from a file.
+
+    The file is a small header followed by capacity rows of HISTORY_DTYPE,
+    so it never grows and keeps the last capacity observations across
+    restarts.  append() writes the row before the count in the header, so a
+    crash between the two loses at most the newest observation.  A missing
+    file, or one of another capacity or format, is started afresh.
+    """
+
+    def __init__(self, path, capacity=HISTORY_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self._map = self._open()
+        self.rows = self._map[HISTORY_HEADER.size:].view(HISTORY_DTYPE)
+        _, _, _, self.written = HISTORY_HEADER.unpack_from(self._map)
+
+    def _open(self):
+        size = HISTORY_HEADER.size + self.capacity * HISTORY_DTYPE.itemsize
+        if os.path.exists(self.path):
+            try:
+                if os.path.getsize(self.path) == size:
+                    mapped = np.memmap(self.path, dtype=np.uint8, mode="r+")
+                    magic, version, capacity, _ = HISTORY_HEADER.unpack_from(mapped)
+                    if magic == HISTORY_MAGIC and version == 1 and capacity == self.capacity:
+                        return mapped
+                    del mapped
+                print(f"Starting weather history {self.path} afresh, it has another size or format")
+            except OSError as e:
+                print(f"Starting weather history {self.path} afresh: {e}")
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(HISTORY_HEADER.pack(HISTORY_MAGIC, 1, self.capacity, 0))
+            file.write(bytes(size - HISTORY_HEADER.size))
+        os.replace(temp_path, self.path)
+        return np.memmap(self.path, dtype=np.uint8, mode="r+")
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    @property
+    def last_time(self):
+        """Time of the newest observation, or None if there is none yet."""
+        if not self.written:
+            return None
+        return float(self.rows[(self.written - 1) % self.capacity]["time"])
+
+    def append(self, timestamp, weather_data):
+        """Record the weather tuple observed at timestamp and return its row.
+
+        Returns None without recording anything if the observation is not
+        newer than the last one, such as the same snapshot seen twice.
+        """
+        last_time = self.last_time
+        if last_time is not None and timestamp <= last_time:
+            return None
+        temp, feels_like, pressure, humidity, wind_speed = (_number(value) for value in weather_data[:5])
+        index = self.written % self.capacity
+        self.rows[index] = (timestamp, temp, feels_like, pressure, humidity, wind_speed)
+        self.written += 1
+        HISTORY_HEADER.pack_into(self._map, 0, HISTORY_MAGIC, 1, self.capacity, self.written)
+        self._map.flush()
+        return self.rows[index].copy()
+
+    def samples(self):
+        """Every observation kept, oldest first, as a new array."""
+        if self.written <= self.capacity:
+            return np.array(self.rows[:self.written])
+        head = self.written % self.capacity
+        return np.concatenate((self.rows[head:], self.rows[:head]))
+
+    def last(self, hours, now=None):
+        """The observations of the last hours hours before now, oldest first."""
+        if now is None:
+            now = time.time()
+        samples = self.samples()
+        # Rows are appended in time order, so the window starts where its start time would be inserted
+        return samples[np.searchsorted(samples["time"], now - hours * 3600, side="right"):]
+
+    def close(self):
+        self._map.flush()
+        del self.rows
+        del self._map
+
+
+def _number(value):
+    return math.nan if value is None else float(value)
@@ -0,0 +1,233 @@
+import json
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ephemeris import EphemerisTable
+from icons import ICON_CODES
+from location import location_from_dict
+from weather_worker import WeatherSnapshot
+
+# Seconds a panel's request waits at the hub for something new before it is answered anyway
+LONG_POLL = 30
+# Days of the ephemeris table the hub sends, starting the day before today
+EPHEMERIS_WINDOW = 8
+# Seconds a panel goes without the hub before fetching its own data
+FALLBACK_AFTER = 60
+
+
+class Hub:
+    """Publish the clock's data to panels over HTTP.
+
+    The clock running as the hub does all the fetching and astronomy and
+    publishes each part of its state, such as the location, weather and the
+    next few days of the ephemeris table, as a named section.  Every publish
+    bumps a version number and the section remembers the version it
+    changed at.  Panels ask GET /state?epoch=E&since=V&wait=S and get back
+    only the sections that changed after version V, waiting up to S seconds
+    for a change if there is none yet.  A panel that has never seen this
+    hub's epoch, for instance after the hub restarted, gets every section.
+    Cached weather icons are served from GET /icons/CODE.
+    """
+
+    def __init__(self, address, icon_atlas=None):
+        self.address = address
+        self.icon_atlas = icon_atlas
+        self.epoch = str(int(time.time() * 1000))
+        self.version = 0
+        self.sections = {}
+        self._encoded = {}
+        self._changed = threading.Condition()
+        self._server = None
+
+    def publish(self, name, data):
+        """Replace section name with data, a JSON-friendly value, if it changed."""
+        # Compared encoded, NaN never equals itself
+        encoded = json.dumps(data, sort_keys=True)
+        with self._changed:
+            if self._encoded.get(name) == encoded:
+                return False
+            self._encoded[name] = encoded
+            self.version += 1
+            self.sections = {**self.sections, name: {"version": self.version, "data": data}}
+            self._changed.notify_all()
+        return True
+
+    def changes(self, epoch=None, since=0, wait=0):
+        """Return the state a panel that has seen version since of epoch is missing, waiting up to wait seconds."""
+        if epoch != self.epoch:
+            since = 0
+        with self._changed:
+            self._changed.wait_for(lambda: self.version > since, timeout=wait)
+            sections = {name: section for name, section in self.sections.items() if section["version"] > since}
+            return {"epoch": self.epoch, "version": self.version, "sections": sections}
+
+    def start(self):
+        host, _, port = self.address.rpartition(":")
+        self._server = ThreadingHTTPServer((host or "0.0.0.0", int(port)), _HubRequestHandler)
+        self._server.daemon_threads = True
+        self._server.hub = self
+        threading.Thread(target=self._server.serve_forever, name="hub", daemon=True).start()
+        print(f"Serving clock data to panels on {self.address}")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class _HubRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        hub = self.server.hub
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if url.path == "/state":
+            try:
+                since = int(query.get("since", ["0"])[0])
+                wait = min(float(query.get("wait", ["0"])[0]), LONG_POLL)
+            except ValueError:
+                self.send_error(400)
+                return
+            body = json.dumps(hub.changes(query.get("epoch", [None])[0], since, wait), separators=(",", ":"))
+            self._send(body.encode("utf-8"), "application/json")
+        elif url.path.startswith("/icons/") and hub.icon_atlas is not None:
+            code = url.path[len("/icons/"):]
+            try:
+                content = hub.icon_atlas.path(code).read_bytes() if code in ICON_CODES else None
+            except OSError:
+                content = None
+            if content is None:
+                self.send_error(404)
+                return
+            self._send(content, "image/png")
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # One line per long poll would flood the log
+
+
+def weather_section(snapshot, stale_after):
+    """The weather section the hub publishes for a WeatherSnapshot."""
+    data = list(snapshot.data)
+    data[6] = list(data[6])
+    return {"data": data, "fetched_at": snapshot.fetched_at, "stale_after": stale_after}
+
+
+class HubClient:
+    """Follow a hub from a panel, keeping the latest of each section it publishes.
+
+    A background thread long-polls the hub, so changes arrive within a
+    moment of being published while an idle hub costs one request per
+    LONG_POLL seconds.  Each section is published to the render loop by
+    replacing an attribute and bumping its version: `location`,
+    `ephemeris` and, with the interface of a WeatherWorker, `snapshot` and
+    is_stale().  Weather icons the panel has not cached yet are fetched from
+    the hub.  `unreachable_for()` tells the render loop how long the hub has
+    been out of reach, so it can start fetching for itself.
+    """
+
+    def __init__(self, url, icon_atlas=None, timeout=5, retry=5):
+        self.url = url.rstrip("/")
+        self.icon_atlas = icon_atlas
+        self.timeout = timeout
+        self.retry = retry
+        self.location = None
+        self.location_version = 0
+        self.ephemeris = None
+        self.ephemeris_version = 0
+        self.snapshot = WeatherSnapshot()
+        self.stale_after = float("inf")
+        # Request statistics, named like the weather worker's for the metrics exporter
+        self.fetch_seconds = 0.0
+        self.fetch_count = 0
+        self.fetch_failures = 0
+        self.connected = False
+        self._reached_at = time.monotonic()
+        self._epoch = None
+        self._version = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="hub-client", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def is_stale(self, now=None):
+        return self.snapshot.is_stale(self.stale_after, now)
+
+    def unreachable_for(self):
+        """Seconds since the hub last answered, 0 while it is reachable."""
+        return 0.0 if self.connected else time.monotonic() - self._reached_at
+
+    def _run(self):
+        while not self._stop.is_set():
+            query = urllib.parse.urlencode({"epoch": self._epoch or "", "since": self._version, "wait": LONG_POLL})
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(f"{self.url}/state?{query}", timeout=LONG_POLL + self.timeout) as response:
+                    changes = json.load(response)
+            except (OSError, ValueError) as e:
+                self._count_fetch(started, failed=True)
+                if self.connected:
+                    print(f"Lost the hub at {self.url}: {e}")
+                    self.connected = False
+                self._stop.wait(self.retry)
+                continue
+            self._count_fetch(started)
+            self._apply(changes)
+            self._reached_at = time.monotonic()
+            if not self.connected:
+                print(f"Following the hub at {self.url}")
+                self.connected = True
+
+    def _apply(self, changes):
+        self._epoch = changes["epoch"]
+        self._version = changes["version"]
+        sections = changes["sections"]
+        if "location" in sections:
+            self.location = location_from_dict(sections["location"]["data"])
+            self.location_version += 1
+        if "ephemeris" in sections:
+            data = sections["ephemeris"]["data"]
+            self.ephemeris = EphemerisTable.from_dict(data) if data else None
+            self.ephemeris_version += 1
+        if "weather" in sections:
+            weather = sections["weather"]["data"]
+            data = weather["data"]
+            for report in data[6]:
+                self._fetch_icon(report["icon"])
+            self.stale_after = weather["stale_after"]
+            self.snapshot = WeatherSnapshot((*data[:6], tuple(data[6])), weather["fetched_at"],
+                                            self.snapshot.version + 1)
+
+    def _fetch_icon(self, code):
+        if self.icon_atlas is None or code not in ICON_CODES or self.icon_atlas.path(code).exists():
+            return
+        try:
+            with urllib.request.urlopen(f"{self.url}/icons/{code}", timeout=self.timeout) as response:
+                self.icon_atlas.store(code, response.read())
+        except OSError as e:
+            print(f"Failed to fetch weather icon {code} from the hub: {e}")
+
+    def _count_fetch(self, started, failed=False):
+        self.fetch_seconds = time.perf_counter() - started
+        self.fetch_count += 1
+        if failed:
+            self.fetch_failures += 1
@@ -0,0 +1,85 @@
+import io
+import os
+import pygame
+from pathlib import Path
+from util import get_cache_dir
+
+# Every icon code OpenWeatherMap uses, day and night variants
+ICON_CODES = [f"{number:02d}{variant}" for number in (1, 2, 3, 4, 9, 10, 11, 13, 50) for variant in "dn"]
+
+
+class IconAtlas:
+    """Weather icons prescaled into a single display-format atlas surface.
+
+    Each icon PNG is downloaded at most once into a disk cache, so after the
+    first run the icons are available offline.  prefetch() does the network
+    part and is safe to call from the weather worker; get() must be called on
+    the render thread and decodes, smoothscales and converts the icon into its
+    atlas slot on first use, returning a subsurface that blits without any
+    pixel format conversion.
+    """
+
+    def __init__(self, icon_size=(100, 100), cache_dir=None, columns=6):
+        self.icon_size = icon_size
+        self.cache_dir = Path(cache_dir) if cache_dir else get_cache_dir() / "icons"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.columns = columns
+        self._atlas = None
+        self._icons = {}
+
+    def path(self, code):
+        return self.cache_dir / f"{code}@2x.png"
+
+    def prefetch(self, code, url=None):
+        """Make sure the icon for code is in the disk cache, downloading it from url if needed."""
+        path = self.path(code)
+        if code not in ICON_CODES or path.exists():
+            return
+        # Imported here so the requests stack loads on the weather worker, not at startup
+        import weather
+        try:
+            content = weather.get_client().get(url or f"{weather.BASE_IMAGE_URL}{code}@2x.png", "icon")
+        except Exception as e:
+            print(f"Failed to download weather icon {code}: {e}")
+            return
+        self.store(code, content)
+
+    def store(self, code, content):
+        """Save the PNG content of the icon for code to the disk cache."""
+        path = self.path(code)
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_bytes(content)
+        os.replace(temp_path, path)
+
+    def get(self, code):
+        """Return the atlas subsurface for code, or None if the icon is not cached."""
+        icon = self._icons.get(code)
+        if icon is not None or code not in ICON_CODES:
+            return icon
+        try:
+            image = pygame.image.load(io.BytesIO(self.path(code).read_bytes()))
+        except (OSError, pygame.error):
+            return None
+        if self._atlas is None:
+            self._atlas = self._create_atlas()
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+        rect = self._slot(code)
+        self._atlas.fill((0, 0, 0, 0), rect)
+        self._atlas.blit(pygame.transform.smoothscale(image, self.icon_size), rect)
+        icon = self._atlas.subsurface(rect)
+        self._icons[code] = icon
+        return icon
+
+    def _create_atlas(self):
+        rows = -(-len(ICON_CODES) // self.columns)
+        size = (self.icon_size[0] * self.columns, self.icon_size[1] * rows)
+        atlas = pygame.Surface(size, pygame.SRCALPHA)
+        if pygame.display.get_surface() is not None:
+            atlas = atlas.convert_alpha()
+        return atlas
+
+    def _slot(self, code):
+        index = ICON_CODES.index(code)
+        column, row = index % self.columns, index // self.columns
+        return pygame.Rect(column * self.icon_size[0], row * self.icon_size[1], *self.icon_size)
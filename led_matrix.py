@@ -0,0 +1,262 @@
+import datetime
+import errno
+import os
+import socket
+import stat
+import struct
+from collections import deque
+import numpy as np
+import pygame
+import pytz
+from background import get_sun_times
+
+# Frame header: magic, format version, width, height, frame number, pixel format
+FRAME_MAGIC = b"LEDF"
+FRAME_HEADER = struct.Struct("<4sBHHIB")
+PIXEL_FORMATS = {"rgb888": 0, "rgb565": 1}
+
+
+class LedMatrix:
+    """Downsample composed frames to an LED matrix and stream them to a sink.
+
+    Each frame is area-averaged from the panel resolution down to the matrix
+    size, passed through a gamma and brightness lookup table and packed into
+    a small header followed by row-major RGB888 or RGB565 pixels.  Chained
+    panels are a single wider or taller matrix size.  The lookup table is
+    rebuilt only when the brightness changes, which a DimmingSchedule can do
+    from the sun times.
+    """
+
+    def __init__(self, size=(64, 32), sink=None, gamma=2.2, brightness=1.0, pixel_format="rgb888", schedule=None):
+        if pixel_format not in PIXEL_FORMATS:
+            raise ValueError(f"Unknown pixel format {pixel_format}, expected one of {', '.join(PIXEL_FORMATS)}")
+        self.size = size
+        self.sink = sink if sink is not None else MemorySink()
+        self.gamma = gamma
+        self.pixel_format = pixel_format
+        self.schedule = schedule
+        self.frames = 0
+        self._scaled = None
+        self._lut = None
+        self.brightness = None
+        self.set_brightness(brightness)
+
+    def set_brightness(self, brightness):
+        """Rebuild the lookup table for brightness, between 0 and 1, if it changed."""
+        brightness = round(min(max(brightness, 0.0), 1.0), 3)
+        if brightness == self.brightness:
+            return
+        self.brightness = brightness
+        levels = np.arange(256) / 255
+        self._lut = np.round(levels ** self.gamma * brightness * 255).astype(np.uint8)
+
+    def present(self, surface, now=None):
+        """Convert surface to a matrix frame, send it to the sink and return the packed bytes."""
+        if self.schedule is not None:
+            self.set_brightness(self.schedule.brightness_at(now))
+        frame = self.pack(self.downsample(surface))
+        self.sink.send(frame)
+        self.frames += 1
+        return frame
+
+    def downsample(self, surface):
+        """Area-average surface down to the matrix size, returning gamma-corrected (height, width, 3) uint8."""
+        if self._scaled is None or self._scaled.get_bitsize() != surface.get_bitsize():
+            self._scaled = pygame.Surface(self.size, 0, surface)
+        # smoothscale shrinks with a box filter, weighting partly covered source pixels by their
+        # area, and does in C what a NumPy reduction needed several times longer for
+        pygame.transform.smoothscale(surface, self.size, self._scaled)
+        pixels = pygame.surfarray.pixels3d(self._scaled)
+        rgb = self._lut[pixels.transpose(1, 0, 2)]
+        del pixels
+        return rgb
+
+    def pack(self, rgb):
+        """Pack (height, width, 3) pixels behind a frame header."""
+        height, width, _ = rgb.shape
+        if self.pixel_format == "rgb565":
+            rgb = rgb.astype(np.uint16)
+            pixels = (rgb[..., 0] >> 3 << 11 | rgb[..., 1] >> 2 << 5 | rgb[..., 2] >> 3).astype("<u2")
+        else:
+            pixels = rgb
+        header = FRAME_HEADER.pack(FRAME_MAGIC, 1, width, height, self.frames & 0xFFFFFFFF,
+                                   PIXEL_FORMATS[self.pixel_format])
+        return header + pixels.tobytes()
+
+
+def unpack_frame(frame):
+    """Decode a packed frame into (frame number, (height, width, 3) uint8 RGB)."""
+    magic, version, width, height, number, pixel_format = FRAME_HEADER.unpack_from(frame)
+    if magic != FRAME_MAGIC or version != 1:
+        raise ValueError("Not an LED matrix frame")
+    body = frame[FRAME_HEADER.size:]
+    if pixel_format == PIXEL_FORMATS["rgb565"]:
+        packed = np.frombuffer(body, dtype="<u2").reshape(height, width)
+        rgb = np.stack([(packed >> 11 & 0x1F) << 3, (packed >> 5 & 0x3F) << 2, (packed & 0x1F) << 3], axis=-1)
+        return number, rgb.astype(np.uint8)
+    return number, np.frombuffer(body, dtype=np.uint8).reshape(height, width, 3)
+
+
+class DimmingSchedule:
+    """Matrix brightness that follows the sun, full by day and dimmed at night.
+
+    Brightness ramps linearly over transition minutes centred on sunrise and
+    sunset.  Sun times are looked up once per local day, in the ephemeris
+    table when one is set.
+    """
+
+    def __init__(self, location, day_brightness=1.0, night_brightness=0.2, transition=60, ephemeris=None):
+        self.location = location
+        self.ephemeris = ephemeris
+        self.day_brightness = day_brightness
+        self.night_brightness = night_brightness
+        self.transition = datetime.timedelta(minutes=transition)
+        self._date = None
+        self._sun_times = None
+
+    def set_location(self, location):
+        self.location = location
+        self._date = None
+
+    def set_ephemeris(self, ephemeris):
+        self.ephemeris = ephemeris
+        self._date = None
+
+    def brightness_at(self, now=None):
+        if now is None:
+            now = datetime.datetime.now(datetime.timezone.utc)
+        sunrise, sunset = self.sun_times(now)
+        half = self.transition / 2
+        if now < sunrise - half or now > sunset + half:
+            return self.night_brightness
+        if sunrise + half <= now <= sunset - half:
+            return self.day_brightness
+        edge = sunrise if now < sunrise + half else sunset
+        daylight = (now - (edge - half)) / self.transition
+        if edge == sunset:
+            daylight = 1 - daylight
+        return self.night_brightness + (self.day_brightness - self.night_brightness) * daylight
+
+    def sun_times(self, now):
+        """Return (sunrise, sunset) for the local day containing now."""
+        date = now.astimezone(pytz.timezone(self.location.timezone)).date()
+        if date != self._date:
+            self._date = date
+            sun_times = self.ephemeris.sun_times(date) if self.ephemeris is not None else None
+            self._sun_times = sun_times or get_sun_times(self.location, date)
+        return self._sun_times
+
+
+class MemorySink:
+    """Keeps the most recent frames in memory, a stand-in for a real matrix in tests and benchmarks."""
+
+    def __init__(self, max_frames=8):
+        self.frames = deque(maxlen=max_frames)
+
+    def send(self, frame):
+        self.frames.append(frame)
+
+    def close(self):
+        self.frames.clear()
+
+
+class FileSink:
+    """Writes frames into a named pipe, or keeps the latest frame in a regular file.
+
+    A regular file holds only the newest frame, overwritten in place, so it
+    never grows however long the clock runs.  Pipes are opened without
+    blocking: until a reader is attached, and whenever the reader falls
+    behind, frames are dropped rather than stalling the render loop.  A frame
+    is larger than a pipe's atomic write, so a write can be cut short; the
+    rest of the frame is kept and written before anything else, and frames
+    are dropped until it is, so the reader always sees whole frames.
+    """
+
+    def __init__(self, path, fifo=False):
+        self.path = path
+        if fifo and not os.path.exists(path):
+            os.mkfifo(path)
+        self._fd = None
+        self._regular = False
+        self._size = None
+        self._pending = b""
+        self.dropped = 0
+
+    def send(self, frame):
+        if self._fd is None:
+            try:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_NONBLOCK, 0o644)
+                self._regular = stat.S_ISREG(os.fstat(self._fd).st_mode)
+            except OSError as e:
+                if e.errno != errno.ENXIO:  # A pipe without a reader yet
+                    print(f"Failed to open LED sink {self.path}: {e}")
+                self.close()
+                self.dropped += 1
+                return
+        try:
+            if self._regular:
+                self._overwrite(frame)
+                return
+            if self._pending:
+                self._pending = self._pending[os.write(self._fd, self._pending):]
+                if self._pending:
+                    self.dropped += 1
+                    return
+            self._pending = memoryview(frame)[os.write(self._fd, frame):]
+        except BlockingIOError:
+            self.dropped += 1
+        except OSError as e:
+            # The reader went away, reopen on the next frame
+            print(f"LED sink {self.path} closed: {e}")
+            self.close()
+            self.dropped += 1
+
+    def _overwrite(self, frame):
+        # Write the frame over the previous one at the start of the file
+        view = memoryview(frame)
+        written = 0
+        while written < len(view):
+            written += os.pwrite(self._fd, view[written:], written)
+        if self._size != len(view):
+            # Cut off whatever a longer frame, or an older file, left behind
+            os.ftruncate(self._fd, len(view))
+            self._size = len(view)
+
+    def close(self):
+        # A new reader starts on a fresh frame
+        self._pending = b""
+        self._size = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SocketSink:
+    """Sends each frame as one datagram to a UNIX datagram socket, dropping frames while nobody listens."""
+
+    def __init__(self, path):
+        self.path = path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self.dropped = 0
+
+    def send(self, frame):
+        try:
+            self._socket.sendto(frame, self.path)
+        except OSError:
+            self.dropped += 1
+
+    def close(self):
+        self._socket.close()
+
+
+def open_sink(target):
+    """Open a sink from unix:PATH, pipe:PATH, file:PATH or memory:"""
+    kind, _, path = target.partition(":")
+    if kind == "unix":
+        return SocketSink(path)
+    if kind in ("pipe", "file"):
+        return FileSink(path, fifo=kind == "pipe")
+    if kind == "memory":
+        return MemorySink()
+    raise ValueError(f"Unknown LED sink {target}, expected unix:PATH, pipe:PATH, file:PATH or memory:")
@@ -1,8 +1,13 @@
-import geocoder
+import threading
 from astral import LocationInfo
 
-def get_location():
-    """Fetches the user's approximate location based on IP address."""
+FALLBACK_LOCATION = LocationInfo("Baltimore", "United States", "America/New_York", 39.515362, -76.411751)
+
+def lookup_location():
+    """Fetches the user's approximate location based on IP address, or None if the lookup fails."""
+    # geocoder pulls in requests and friends, only pay for the import once a lookup is needed
+    import geocoder
+
     g = geocoder.ip('me')  # Fetch geolocation data
     if g.latlng:
         lat, lon = g.latlng
@@ -10,5 +15,57 @@ def get_location():
         country = g.country or "Unknown"
         timezone = g.json.get("raw", {}).get("timezone", "UTC")
         return LocationInfo(city, country, timezone, lat, lon)
-    else:
-        return LocationInfo("Baltimore", "United States", "US/New York", 39.515362, -76.411751)  # Fallback
+    return None
+
+def get_location():
+    """Fetches the user's approximate location based on IP address."""
+    return lookup_location() or FALLBACK_LOCATION  # Fallback
+
+def location_to_dict(location):
+    return {"name": location.name, "region": location.region, "timezone": location.timezone,
+            "latitude": location.latitude, "longitude": location.longitude}
+
+def location_from_dict(data):
+    return LocationInfo(data["name"], data["region"], data["timezone"], data["latitude"], data["longitude"])
+
+
+class LocationResolver:
+    """Resolve the location in the background, starting from the last saved one.
+
+    `location` is usable immediately: the location saved in the startup state
+    by a previous run, or the fallback on the very first boot.  start() looks
+    the location up on a background thread; a successful lookup is saved for
+    the next boot and published by bumping `version`, which the render loop
+    polls.  A failed lookup keeps the saved location.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        self.location = FALLBACK_LOCATION
+        self.version = 0
+        saved = state.get("location")
+        if saved:
+            try:
+                self.location = location_from_dict(saved)
+            except (KeyError, TypeError, ValueError):
+                pass
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._resolve, name="location-resolver", daemon=True)
+            self._thread.start()
+        return self
+
+    def _resolve(self):
+        try:
+            location = lookup_location()
+        except Exception as e:
+            print(f"Location lookup failed: {e}")
+            return
+        if location is None:
+            return
+        self.state.set("location", location_to_dict(location))
+        if location_to_dict(location) != location_to_dict(self.location):
+            self.location = location
+            self.version += 1
@@ -1,19 +1,67 @@
+import time
+
+# Taken before the heavy imports so the reported time-to-first-frame includes them
+STARTED_AT = time.perf_counter()
+
+import datetime
+import os
+import random
 import typer
 import pygame
 import sys
-import time
-import random
-from util import setup_display, get_current_time, interpolate_color, get_config, draw_text
-from weather import get_weather, load_weather_icon
-from background import get_background_color, draw_background_gradient, get_sun_times, draw_starry_sky, draw_cloudy_night
-from location import get_location
-from moon import draw_moon
-from cloud import Cloud
-from star import Star
-from raindrop import Raindrop
+import numpy as np
+from util import setup_display, setup_headless_display, get_timezone, draw_text, get_cache_dir
+from background import SkyTimeline, draw_background_gradient, draw_starry_sky, draw_cloudy_night
+from location import LocationResolver, location_to_dict
+from ephemeris import EphemerisStore
+from hub import Hub, HubClient, weather_section, EPHEMERIS_WINDOW, FALLBACK_AFTER
+from moon import MoonRenderer
+from particles import StarField, CloudField, RainField
+from precipitation import Precipitation
+from weather_worker import WeatherWorker, EMPTY_WEATHER
+from icons import IconAtlas
+from scheduler import FrameScheduler
+from clock import SystemClock, WarpClock, WarpScheduler
+from text import DigitAtlas, text_cache
+from compositor import Compositor
+from metrics import FrameMetrics, MetricsExporter, Hud
+from state import StartupState
+from frame_state import FrameState
+from framebuffer import Framebuffer
+from led_matrix import LedMatrix, DimmingSchedule, open_sink
+from quality import QualityGovernor, get_tier
+from config import ConfigWatcher
+from history import WeatherHistory
+from sparkline import Sparkline
 
 app = typer.Typer()
 
+# Typical cloud cover in percent for the OpenWeatherMap cloud descriptions
+CLOUD_COVER_BY_DESCRIPTION = {
+    "few clouds": 20,
+    "scattered clouds": 40,
+    "broken clouds": 70,
+    "overcast clouds": 100,
+}
+
+# Formats --warp-start accepts, with or without seconds
+WARP_START_FORMATS = ["%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"]
+
+DEFAULT_FONT = "arial"
+# Font size of each line of text as a share of the screen height
+FONT_SIZES = {"clock": 0.3, "date": 0.1, "weather": 0.1, "weather_det": 0.04}
+
+# Trend charts under the text: weather history field, label and line color
+TREND_FIELDS = [
+    ("temp", "Temp", (255, 170, 90)),
+    ("pressure", "Pressure", (140, 190, 255)),
+    ("humidity", "Humidity", (140, 230, 150)),
+]
+TREND_HOURS = 24
+# Charts are a sixteenth of the screen height tall, and not shown at all below the minimum
+TREND_CHART_SHARE = 16
+TREND_CHART_MIN_HEIGHT = 8
+
 @app.command(
     context_settings={"ignore_unknown_options": True}
 )
@@ -26,230 +74,696 @@ def start_clock(
     zip_code: str = typer.Argument("xxxxx", help="Zipcode to determine weather for"),
     country_code: str = typer.Argument("us", help="Country code to determine weather for"),
     open_weather_api_key: str = typer.Argument("xxx", help="openweathermap.org api key"),
+    weather_interval: int = typer.Option(3600, help="Seconds between weather refreshes"),
+    daily_call_budget: int = typer.Option(1000, help="Maximum weather API calls per day for this clock"),
+    weather_url: str = typer.Option(None, help="OpenWeatherMap current weather endpoint to query instead of the public one, e.g. a local stand-in"),
+    power_profile: str = typer.Option("balanced", help="Frame rate cap while animating: eco (1 fps), low (15), balanced (30) or smooth (60)"),
+    hud: bool = typer.Option(False, help="Show the frame-time HUD at start, toggle it with the H key"),
+    metrics_file: str = typer.Option(None, help="Write Prometheus textfile collector metrics to this file"),
+    metrics_interval: int = typer.Option(15, help="Seconds between metrics file writes"),
+    framebuffer: str = typer.Option(None, help="Draw straight to this framebuffer device (e.g. /dev/fb0) instead of the video driver"),
+    framebuffer_bpp: int = typer.Option(None, help="Framebuffer bits per pixel, 16 or 32, when it cannot be read from sysfs"),
+    led_matrix: str = typer.Option(None, help="Also stream frames downsampled to an LED matrix of this size, e.g. 64x32"),
+    led_sink: str = typer.Option("pipe:/tmp/pi-led-clock-matrix", help="Where LED matrix frames go: unix:PATH, pipe:PATH, file:PATH or memory:"),
+    led_format: str = typer.Option("rgb888", help="LED matrix pixel format, rgb888 or rgb565"),
+    led_gamma: float = typer.Option(2.2, help="LED matrix gamma"),
+    led_brightness: float = typer.Option(1.0, help="LED matrix brightness from 0 to 1"),
+    led_night_brightness: float = typer.Option(None, help="Dim the LED matrix to this brightness between sunset and sunrise"),
+    quality: str = typer.Option("auto", help="Effects quality: auto adapts to the host's speed, or pin ultra, high, medium, low or minimal"),
+    hub_listen: str = typer.Option(None, help="Serve this clock's location, weather and sun and moon data to panels on HOST:PORT"),
+    hub: str = typer.Option(None, help="Run as a panel of the hub at this URL, e.g. http://clock-hub:8765, fetching locally only while it is unreachable"),
+    warp: float = typer.Option(None, help="Run on simulated time this many times faster than real time, e.g. 720 for a day in two minutes"),
+    warp_start: datetime.datetime = typer.Option(None, formats=WARP_START_FORMATS, help="Simulated time to start from with --warp, in the clock's timezone (default now)"),
+    seed: int = typer.Option(None, help="Seed the random placement of stars, clouds and rain for repeatable runs"),
+    config: str = typer.Option(None, help="JSON file of settings that override the arguments, applied live whenever it changes"),
 
 ):
     """
     Start the clock
     """
-    
-    # Set up the screen
-    screen = setup_display(display, video_driver, screen_width, screen_height)
+    if hub and hub_listen:
+        raise typer.BadParameter("A clock is either a hub or a panel, pass only one of --hub and --hub-listen")
+    if warp_start and not warp:
+        raise typer.BadParameter("--warp-start only applies with --warp")
+
+    # Set up the screen, or an off-screen surface copied to the framebuffer
+    if framebuffer:
+        screen = setup_headless_display(screen_width, screen_height)
+        output = Framebuffer(framebuffer, (screen_width, screen_height), framebuffer_bpp)
+        print(f"Drawing to {framebuffer}, {output.size[0]}x{output.size[1]} {output.pixel_format}")
+    else:
+        screen = setup_display(display, video_driver, screen_width, screen_height)
+        output = None
     pygame.display.set_caption("Dynamic Clock")
 
-    # Load fonts
-    clock_font, date_font, weather_font, weather_det_font = _load_fonts(screen_height)
+    # Settings from the config file win over the arguments, and are picked up again whenever the file changes
+    settings = {"timezone": timezone_name, "zip_code": zip_code, "country_code": country_code,
+                "font": DEFAULT_FONT, "font_sizes": dict(FONT_SIZES), "effects": {}}
+    config_watcher = None
+    config_version = 0
+    if config:
+        config_watcher = ConfigWatcher(config, settings)
+        config_watcher.load()
+        config_version = config_watcher.version
+        settings = config_watcher.settings
 
     running = True
-    clock = pygame.time.Clock()
-    frame_count = 0
-
-    # Fetch initial weather data
-    weather_data = _update_weather(zip_code, country_code, open_weather_api_key)
-    last_weather_update = time.time()  # Timestamp of the last weather update
-
-    location = get_location()
-    sun_rise, sun_set = get_sun_times(location)
-    background_colors = _get_background_colors(location, sun_rise, sun_set)
-    
-    clouds = create_clouds(screen_width, screen_height)
-    stars = create_stars(screen_width, screen_height)
+    scheduler = FrameScheduler.from_profile(power_profile)
+    profile_fps = scheduler.max_fps
+    tier = get_tier("high" if quality == "auto" else quality)
+    frame_dt = 0
+    timezone = get_timezone(settings["timezone"])
+    clock = SystemClock()
+    if warp:
+        # Simulated time only moves frame by frame, the sky and the date run through the days at warp speed
+        start = timezone.localize(warp_start) if warp_start else clock.now(timezone)
+        clock = WarpClock(start, warp)
+        scheduler = WarpScheduler(clock, profile_fps)
+        print(f"Time warp x{warp:g} from {start}")
+    if seed is not None:
+        random.seed(seed)
+    rng = np.random.default_rng(seed)
+
+    # The location and font paths saved by the last run let the first frame go up without waiting on the network
+    state = StartupState(get_cache_dir() / "state.json")
+    location_resolver = LocationResolver(state)
+    location_version = location_resolver.version
+    # Sun and moon events come from a table saved by an earlier run, rebuilt in the background when missing or running out
+    ephemeris = EphemerisStore(get_cache_dir())
+    ephemeris.load(location_resolver.location)
+    ephemeris_version = ephemeris.version
+    icon_atlas = IconAtlas()
+    # Every weather report is kept in a fixed-size file for the trend charts
+    weather_history = WeatherHistory(get_cache_dir() / "weather_history.bin")
+    scene = ClockScene(screen, location_resolver.location, icon_atlas, clock.now(timezone),
+                       (screen_width, screen_height), state, {**tier, **settings["effects"]}, ephemeris.table, rng,
+                       settings["font"], settings["font_sizes"], weather_history)
+    if output is not None:
+        scene.compositor.output = output.present
+
+    def apply_quality(tier):
+        # Effects set in the config file hold whatever the tier
+        scene.set_quality({**tier, **settings["effects"]})
+        scheduler.max_fps = min(tier["max_fps"], profile_fps)
+        scene.precipitation.set_frame_rate(scheduler.max_fps)
+
+    apply_quality(tier)
+    led = None
+    if led_matrix:
+        schedule = None
+        if led_night_brightness is not None:
+            schedule = DimmingSchedule(location_resolver.location, led_brightness, led_night_brightness,
+                                       ephemeris=ephemeris.table)
+        led = LedMatrix(_parse_size(led_matrix), open_sink(led_sink), led_gamma, led_brightness, led_format, schedule)
+    now = clock.now(timezone)
+    scene.update(now, frame_dt)
+    scene.present()
+    if led:
+        led.present(screen, now)
+    first_frame = time.perf_counter() - STARTED_AT
+    print(f"First frame after {first_frame * 1000:.0f} ms")
+
+    # Refresh the location and fetch weather in the background, the clock keeps drawing the last good values.
+    # A panel takes them from its hub instead, and only fetches for itself while the hub is out of reach.
+    def start_weather():
+        return _start_weather_worker(settings["zip_code"], settings["country_code"], open_weather_api_key, icon_atlas,
+                                     weather_interval, daily_call_budget, weather_url)
+
+    def fetch_locally():
+        location_resolver.start()
+        ephemeris.refresh(location_resolver.location, clock.now())
+        return start_weather()
+
+    hub_client = HubClient(hub, icon_atlas).start() if hub else None
+    hub_location_version = hub_ephemeris_version = 0
+    weather_worker = fetch_locally() if hub_client is None else None
+    weather_source = weather_worker or hub_client
+    weather_version = 0  # The scene starts without weather, the worker may publish before the loop first looks
+    ephemeris_checked = now.date()
+    hub_server = Hub(hub_listen, icon_atlas).start() if hub_listen else None
+    if hub_server:
+        _publish_location(hub_server, location_resolver.location, ephemeris, now)
+
+    # With auto quality, time animation frames composed over the whole screen at each tier to find
+    # where to start, then keep watching the frame times
+    governor = None
+    if quality == "auto":
+        def render_full_frame():
+            scene.compositor.force_full_update()
+            scene.update(clock.now(timezone), 1 / scheduler.max_fps)
+            scene.present()
+
+        governor = QualityGovernor(apply_quality, profile_fps)
+        governor.calibrate(render_full_frame)
+
+    # Frame-time instrumentation only runs while the HUD is shown or metrics are exported
+    metrics = FrameMetrics()
+    metrics.first_frame = first_frame
+    metrics_exporter = MetricsExporter(metrics_file, metrics_interval) if metrics_file else None
+    hud_layer = scene.compositor.add_layer("hud", Hud(metrics).draw)
+    hud_layer.set_visible(hud)
+    scene.compositor.profile = hud or metrics_exporter is not None
+    hud_second = 0
+    if config_watcher:
+        config_watcher.start()
 
     while running:
         # Handle events
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-
-        screen.fill((0, 0, 0))  # Clear screen
-        
-        # Update weather data every hour
-        current_time = time.time()
-        if current_time - last_weather_update >= 3600:  # 3600 seconds = 1 hour
-            weather_data = _update_weather(zip_code, country_code, open_weather_api_key)
-            last_weather_update = current_time
-            sun_rise, sun_set = get_sun_times(location)
-            background_colors = _get_background_colors(location,  sun_rise, sun_set)
-            
-        draw_background_gradient(screen, screen_height, screen_width, *background_colors)
-
-        # Get current time and date
-        now = get_current_time(timezone_name)
-        time_str = now.strftime("%H:%M:%S")
-        date_str = now.strftime("%A, %B %d, %Y")
-        
-        # Increment frame count for animation
-        frame_count += 1
-
-        # Calculate text positions
-        text_positions = _calculate_text_positions(screen, now, weather_data, clock_font, date_font, weather_font, weather_det_font)
-
-        _draw_weather_icons(screen, weather_data)
-        
-        if now < sun_rise or now > sun_set:
-            _draw_night_effects(screen, screen_width, screen_height, weather_data[6][0]["weather"], clouds, stars)
-        
-        # Draw the moon only at night
-        if now < sun_rise or now > sun_set:
-            draw_moon(screen, location.timezone)
-
-        # Draw time and date with glow
-        draw_text(screen, time_str, clock_font, (255, 255, 255), text_positions["clock"], (0, 0, 0), 3)
-        draw_text(screen, date_str, date_font, (255, 255, 255), text_positions["date"], (0, 0, 0), 2)
-        draw_text(screen, text_positions["weather_text"], weather_font, (255, 255, 255), text_positions["weather"], (0, 0, 0), 2)
-        draw_text(screen, text_positions["weather_det_text"], weather_det_font, (255, 255, 255), text_positions["weather_det"], (0, 0, 0), 2)
-
-        # Update display
-        pygame.display.flip()
-
-        # Cap the frame rate
-        clock.tick(60)
-
+            elif event.type == pygame.VIDEOEXPOSE:
+                scene.compositor.invalidate_all()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_h:
+                hud = not hud
+                hud_layer.set_visible(hud)
+                scene.compositor.profile = hud or metrics_exporter is not None
+
+        # Apply a changed config file, resetting only what the changed settings feed
+        if config_watcher and config_watcher.version != config_version:
+            config_version = config_watcher.version
+            old_settings, settings = settings, config_watcher.settings
+            if settings["timezone"] != old_settings["timezone"]:
+                timezone = get_timezone(settings["timezone"])
+            if settings["font"] != old_settings["font"] or settings["font_sizes"] != old_settings["font_sizes"]:
+                scene.set_fonts(settings["font"], settings["font_sizes"])
+            if settings["effects"] != old_settings["effects"]:
+                apply_quality(governor.tier if governor else tier)
+            if (settings["zip_code"], settings["country_code"]) != (old_settings["zip_code"], old_settings["country_code"]) \
+                    and weather_worker:
+                # Weather for the old place is shown until the first report for the new one is in
+                weather_worker.stop(timeout=0)
+                weather_worker = start_weather()
+                if weather_source is not hub_client:
+                    weather_source = weather_worker
+                weather_version = 0
+
+        if location_resolver.version != location_version:
+            location_version = location_resolver.version
+            scene.set_location(location_resolver.location, ephemeris.load(location_resolver.location))
+            if led and led.schedule:
+                led.schedule.set_location(location_resolver.location)
+                led.schedule.set_ephemeris(ephemeris.table)
+            ephemeris.refresh(location_resolver.location, now)
+            if hub_server:
+                _publish_location(hub_server, location_resolver.location, ephemeris, now)
+
+        # Switch to a newly built ephemeris table, and check once a day whether the table is running out
+        if ephemeris.version != ephemeris_version:
+            ephemeris_version = ephemeris.version
+            if ephemeris.table is not None and ephemeris.table.matches(location_resolver.location):
+                scene.set_ephemeris(ephemeris.table)
+                if led and led.schedule:
+                    led.schedule.set_ephemeris(ephemeris.table)
+                if hub_server:
+                    _publish_location(hub_server, location_resolver.location, ephemeris, now)
+        if now.date() != ephemeris_checked:
+            ephemeris_checked = now.date()
+            if weather_worker:
+                ephemeris.refresh(location_resolver.location, now)
+            if hub_server:
+                _publish_location(hub_server, location_resolver.location, ephemeris, now)
+
+        if hub_client:
+            # Follow the hub's location and sun and moon data
+            if hub_client.location is not None and (hub_client.location_version != hub_location_version
+                                                    or hub_client.ephemeris_version != hub_ephemeris_version):
+                hub_location_version = hub_client.location_version
+                hub_ephemeris_version = hub_client.ephemeris_version
+                hub_ephemeris = hub_client.ephemeris
+                if hub_ephemeris is not None and not hub_ephemeris.matches(hub_client.location):
+                    hub_ephemeris = None
+                scene.set_location(hub_client.location, hub_ephemeris)
+                if led and led.schedule:
+                    led.schedule.set_location(hub_client.location)
+                    led.schedule.set_ephemeris(hub_ephemeris)
+            # Fetch locally while the hub is out of reach, and hand back to it once it has weather again
+            if weather_worker is None and hub_client.unreachable_for() > FALLBACK_AFTER:
+                print("Hub unreachable, fetching data locally")
+                weather_worker = weather_source = fetch_locally()
+                weather_version = 0
+            elif weather_worker is not None and hub_client.connected and hub_client.snapshot.version:
+                weather_worker.stop(timeout=0)  # A fetch in flight finishes on its own thread
+                weather_worker = None
+                weather_source = hub_client
+                weather_version = None
+
+        # Pick up a new weather snapshot once the worker has published it
+        weather_snapshot = weather_source.snapshot
+        if weather_snapshot.version != weather_version:
+            weather_version = weather_snapshot.version
+            scene.set_weather(weather_snapshot.data)
+            sample = weather_history.append(weather_snapshot.fetched_at, weather_snapshot.data)
+            if sample is not None:
+                scene.add_history(sample)
+            if hub_server:
+                hub_server.publish("weather", weather_section(weather_snapshot, weather_worker.stale_after))
+
+        frame_start = time.perf_counter()
+        now = clock.now(timezone)
+        scene.update(now, frame_dt, weather_source.is_stale())
+
+        # Push only the regions that changed to the display, and changed frames to the LED matrix
+        if scene.present() and led:
+            led.present(screen, now)
+        frame_time = time.perf_counter() - frame_start
+
+        # Only frames drawn while animating count towards the quality tier, idle seconds are cheap anyway
+        animating = scene.animating()
+        if governor and animating:
+            governor.record(frame_time)
+
+        if scene.compositor.profile:
+            metrics.record(scene.compositor.timings, frame_time)
+            if metrics_exporter:
+                metrics_exporter.maybe_write(metrics, weather_source)
+            if hud and int(time.time()) != hud_second:
+                hud_second = int(time.time())
+                hud_layer.invalidate()
+
+        # Sleep until the next second, or the next animation frame while anything is moving
+        frame_dt = scheduler.wait(animating)
+
+    if weather_worker:
+        weather_worker.stop(timeout=1)
+    if config_watcher:
+        config_watcher.stop()
+    if hub_client:
+        hub_client.stop()
+    if hub_server:
+        hub_server.stop()
+    if output is not None:
+        output.close()
+    if led:
+        led.sink.close()
+    weather_history.close()
     pygame.quit()
     sys.exit()
 
-def _draw_night_effects(screen, width, height, weather_condition, clouds, stars):
+
+class ClockScene:
+    """Everything shown on the clock, kept as compositor layers.
+
+    The scene only knows the time, weather and location it is given, so the
+    same drawing code runs on the panel and under the headless benchmark.
+    Each layer is redrawn only when its inputs change.  How rich the effects
+    are is set by a quality tier from quality.QUALITY_TIERS.  With a
+    WeatherHistory, trend charts of the last TREND_HOURS hours are shown
+    under the text.
+    """
+
+    def __init__(self, screen, location, icon_atlas, now, size=None, state=None, quality=None, ephemeris=None, rng=None,
+                 font=DEFAULT_FONT, font_sizes=None, history=None):
+        self.screen = screen
+        self.location = location
+        self.icon_atlas = icon_atlas
+        self.screen_width, self.screen_height = size or screen.get_size()
+        self.state = state
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        # Load fonts
+        self.font = font
+        self.font_sizes = font_sizes or FONT_SIZES
+        self.clock_font, self.date_font, self.weather_font, self.weather_det_font = _load_fonts(
+            self.screen_height, state, font, self.font_sizes)
+        self.quality = quality or get_tier("high")
+        self.clock_atlas = DigitAtlas(self.clock_font, (255, 255, 255), (0, 0, 0), self.quality["clock_glow"])
+        self.ephemeris = ephemeris
+        self.moon_renderer = MoonRenderer(ephemeris=ephemeris)
+        self.moon_redraw_interval = 300  # The moon renderer refreshes its ephemeris every 5 minutes
+        self.moon_drawn_at = now.timestamp()
+
+        self.clouds = create_clouds(self.screen_width, self.screen_height, self._particle_count("clouds"), self.rng)
+        self.stars = create_stars(self.screen_width, self.screen_height, self._particle_count("stars"), self.rng)
+        self.precipitation = Precipitation(self.screen_width, self.screen_height, rng=self.rng)
+        self.precipitation.set_density(self.quality["precipitation"])
+        self.frame_dt = 0
+
+        self.weather_data = EMPTY_WEATHER
+        self.weather_stale = False
+        self.history = history
+        self.trends = None
+        self.sky_timeline = SkyTimeline.for_time(location, now, ephemeris)
+        self.now = now
+        # The clock is measured the way the atlas draws it, by character advances without kerning
+        self.frame_state = FrameState((self.screen_width, self.screen_height), self.clock_font, self.date_font,
+                                      self.weather_font, self.weather_det_font,
+                                      lambda text: self.clock_atlas.size(text), self._trends_height())
+        self.frame_state.set_time(now)
+        self.background_colors = self.sky_timeline.colors_at(now)
+
+        # Each layer keeps its own surface and is only redrawn when invalidated
+        self.compositor = Compositor(screen)
+        self.sky_layer = self.compositor.add_layer("sky", self._draw_sky, opaque=True)
+        self.icons_layer = self.compositor.add_layer("icons", self._draw_icons)
+        self.moon_layer = self.compositor.add_layer("moon", self._draw_moon)
+        self.particles_layer = self.compositor.add_layer("particles", self._draw_particles, animated=True)
+        self.precipitation_layer = self.compositor.add_layer("precipitation", self._draw_precipitation, animated=True)
+        self.clock_layer = self.compositor.add_layer("clock", self._draw_clock)
+        self.details_layer = self.compositor.add_layer("details", self._draw_details)
+        self.trends_layer = self.compositor.add_layer("trends", self._draw_trends)
+        self.precipitation_layer.set_visible(False)
+        self._show_night(now)
+
+    def set_weather(self, weather_data):
+        self.weather_data = weather_data
+        self.clouds.set_cover(_cloud_cover(weather_data))
+        self.precipitation.set_weather(weather_data[6])
+        self.precipitation_layer.set_visible(self.precipitation.effect is not None)
+        self.icons_layer.invalidate()
+        if self.frame_state.set_weather(weather_data, self.weather_stale):
+            self.details_layer.invalidate()
+
+    def set_quality(self, quality):
+        """Switch to another quality tier, rebuilding only what the tier changes."""
+        old, self.quality = self.quality, quality
+        if quality["clouds"] != old["clouds"]:
+            self.clouds = create_clouds(self.screen_width, self.screen_height, self._particle_count("clouds"), self.rng)
+            self.clouds.set_cover(_cloud_cover(self.weather_data))
+        if quality["stars"] != old["stars"]:
+            self.stars = create_stars(self.screen_width, self.screen_height, self._particle_count("stars"), self.rng)
+        self.precipitation.set_density(quality["precipitation"])
+        if quality["clock_glow"] != old["clock_glow"]:
+            self.clock_atlas = DigitAtlas(self.clock_font, (255, 255, 255), (0, 0, 0), quality["clock_glow"])
+            self.clock_layer.invalidate()
+        if quality["text_glow"] != old["text_glow"]:
+            self.details_layer.invalidate()
+            self.trends_layer.invalidate()
+        if quality["gradient_step"] != old["gradient_step"]:
+            self.sky_layer.invalidate()
+
+    def set_fonts(self, font, sizes):
+        """Switch to font at sizes, shares of the screen height, reloading only the lines whose font changed."""
+        height = self.screen_height
+        old_fonts = (self.clock_font, self.date_font, self.weather_font, self.weather_det_font)
+        fonts = []
+        font_path = None
+        for name, old in zip(FONT_SIZES, old_fonts):
+            size = int(height * sizes[name])
+            if font == self.font and int(height * self.font_sizes[name]) == size:
+                fonts.append(old)
+                continue
+            if font_path is None:
+                font_path = _match_font(font, self.state)
+            fonts.append(pygame.font.Font(font_path, size))
+        fonts = tuple(fonts)
+        self.font, self.font_sizes = font, sizes
+        if fonts == old_fonts:
+            return
+        self.clock_font, self.date_font, self.weather_font, self.weather_det_font = fonts
+        if self.clock_font is not old_fonts[0]:
+            self.clock_atlas = DigitAtlas(self.clock_font, (255, 255, 255), (0, 0, 0), self.quality["clock_glow"])
+        # Text rendered in the replaced fonts is never drawn again
+        text_cache.clear()
+        self.frame_state.set_fonts(*fonts)
+        self.frame_state.reserve = self._trends_height()
+        self.clock_layer.invalidate()
+        self.details_layer.invalidate()
+        # The charts move with the text above them
+        self.trends = None
+        self.trends_layer.invalidate()
+
+    def add_history(self, sample):
+        """Add a sample just recorded in the weather history to the trend charts."""
+        if self.trends is not None:
+            for field, _, chart, _ in self.trends:
+                chart.append(sample["time"], sample[field])
+        self.trends_layer.invalidate()
+
+    def set_location(self, location, ephemeris=None):
+        """Move to location, with its ephemeris table if there is one yet."""
+        self.location = location
+        self.set_ephemeris(ephemeris)
+
+    def set_ephemeris(self, ephemeris):
+        """Take sun and moon events from the ephemeris table, or compute them for None."""
+        self.ephemeris = ephemeris
+        self.moon_renderer.ephemeris = ephemeris
+        self.moon_layer.invalidate()
+        self.sky_timeline = SkyTimeline.for_time(self.location, self.now, ephemeris)
+        self.background_colors = self.sky_timeline.colors_at(self.now)
+        self.sky_layer.invalidate()
+        self._show_night(self.now)
+
+    def update(self, now, dt, weather_stale=False):
+        """Advance the scene to now, invalidating the layers whose content changed.
+
+        Everything but the frame time only changes with the second, so the
+        frames in between return as soon as the second is found unchanged.
+        """
+        self.now = now
+        self.frame_dt = dt
+        changed = self.frame_state.set_time(now)
+        if changed is None:
+            return
+        self.clock_layer.invalidate()
+
+        # Redraw the moon so it follows its phase
+        if now.timestamp() - self.moon_drawn_at >= self.moon_redraw_interval:
+            self.moon_drawn_at = now.timestamp()
+            self.moon_layer.invalidate()
+
+        if changed != "second":
+            # A new minute: rebuild the sky timeline after midnight and look up the sky colors
+            if not self.sky_timeline.covers(now):
+                self.sky_timeline = SkyTimeline.for_time(self.location, now, self.ephemeris)
+            background_colors = self.sky_timeline.colors_at(now)
+            if background_colors != self.background_colors:
+                self.background_colors = background_colors
+                self.sky_layer.invalidate()
+        if changed == "day":
+            self.details_layer.invalidate()
+        if weather_stale != self.weather_stale:
+            self.weather_stale = weather_stale
+            if self.frame_state.set_weather(self.weather_data, weather_stale):
+                self.details_layer.invalidate()
+
+        self._show_night(now)
+
+    def present(self):
+        if not self.precipitation_layer.visible:
+            return self.compositor.present()
+        started = time.perf_counter()
+        dirty = self.compositor.present()
+        elapsed = time.perf_counter() - started
+        # present() ran the precipitation draw, which end_frame() adds on its own
+        self.precipitation.end_frame(elapsed - (self.precipitation.draw_seconds or 0))
+        return dirty
+
+    def animating(self):
+        return self.compositor.animating()
+
+    def _particle_count(self, name):
+        # Tier counts are for an 800x480 panel
+        return max(1, round(self.quality[name] * self.screen_width * self.screen_height / (800 * 480)))
+
+    def _show_night(self, now):
+        # Night effects and the moon are only shown at night
+        is_night = now < self.sky_timeline.sunrise or now > self.sky_timeline.sunset
+        self.particles_layer.set_visible(is_night)
+        self.moon_layer.set_visible(is_night)
+
+    def _draw_sky(self, surface):
+        draw_background_gradient(surface, self.screen_height, self.screen_width, *self.background_colors,
+                                 self.quality["gradient_step"])
+
+    def _draw_icons(self, surface):
+        _draw_weather_icons(surface, self.weather_data, self.icon_atlas)
+
+    def _draw_moon(self, surface):
+        self.moon_renderer.draw(surface, self.now)
+
+    def _draw_particles(self, surface):
+        return _draw_night_effects(surface, self.screen_width, self.screen_height, _weather_condition(self.weather_data),
+                                   self.clouds, self.stars, self.frame_dt)
+
+    def _draw_precipitation(self, surface):
+        return self.precipitation.draw(surface, self.frame_dt)
+
+    def _trends_height(self):
+        """Height of the row of trend charts with their labels, 0 without a weather history."""
+        if self.history is None:
+            return 0
+        return self.weather_det_font.get_height() + 4 + self.screen_height // TREND_CHART_SHARE
+
+    def _trend_charts(self):
+        """The trend charts as (field, label, chart, position), laid out under the text on first use."""
+        if self.trends is not None:
+            return self.trends
+        self.trends = []
+        if self.history is None:
+            return self.trends
+        label_height = self.weather_det_font.get_height()
+        top = self.frame_state.positions["trends"][1]
+        chart_height = min(self.screen_height // TREND_CHART_SHARE, self.screen_height - top - label_height - 4)
+        if chart_height < TREND_CHART_MIN_HEIGHT:
+            # Laid out again only when the fonts change, so this is said once per layout
+            print(f"No room for the trend charts under the text, they need {self._trends_height()} pixels "
+                  f"and {max(0, self.screen_height - top)} are left; use smaller font sizes to show them")
+            return self.trends
+        chart_width = self.screen_width // 5
+        gap = self.screen_width // 20
+        left = (self.screen_width - len(TREND_FIELDS) * chart_width - (len(TREND_FIELDS) - 1) * gap) // 2
+        samples = self.history.last(TREND_HOURS)
+        for index, (field, label, color) in enumerate(TREND_FIELDS):
+            chart = Sparkline((chart_width, chart_height), color, TREND_HOURS * 3600)
+            chart.set_samples(samples["time"], samples[field])
+            self.trends.append((field, label, chart, (left + index * (chart_width + gap), top)))
+        return self.trends
+
+    def _draw_trends(self, surface):
+        glow = self.quality["text_glow"]
+        label_height = self.weather_det_font.get_height()
+        for _, label, chart, (x, y) in self._trend_charts():
+            if len(chart) < 2:
+                continue
+            draw_text(surface, label, self.weather_det_font, (255, 255, 255), (x, y), (0, 0, 0), glow)
+            chart.draw(surface, (x, y + label_height + 4))
+
+    def _draw_clock(self, surface):
+        self.clock_atlas.draw(surface, self.frame_state.time_str, self.frame_state.positions["clock"])
+
+    def _draw_details(self, surface):
+        state = self.frame_state
+        positions = state.positions
+        glow = self.quality["text_glow"]
+        draw_text(surface, state.date_str, self.date_font, (255, 255, 255), positions["date"], (0, 0, 0), glow)
+        draw_text(surface, state.weather_text, self.weather_font, (255, 255, 255), positions["weather"], (0, 0, 0), glow)
+        draw_text(surface, state.weather_det_text, self.weather_det_font, (255, 255, 255), positions["weather_det"], (0, 0, 0), glow)
+
+
+def _draw_night_effects(screen, width, height, weather_condition, clouds, stars, dt):
+    """Draw stars or clouds for the current condition and return the rects drawn."""
     if weather_condition in ["clear", "clear sky"]:
-        draw_starry_sky(screen, width, height, stars)
+        return draw_starry_sky(screen, width, height, stars, dt)
     elif weather_condition in ["clouds", "overcast clouds", "broken clouds"]:
-        draw_cloudy_night(screen, width, height, clouds)
-    
+        return draw_cloudy_night(screen, width, height, clouds, dt)
+    return []
 
 
-def _load_fonts(screen_height):
+def _publish_location(hub, location, ephemeris, now):
+    """Publish location and the next few days of its ephemeris table, if there is one yet, to the panels."""
+    hub.publish("location", location_to_dict(location))
+    window = None
+    if ephemeris.table is not None and ephemeris.table.matches(location):
+        window = ephemeris.table.window(ephemeris.table.local_date(now) - datetime.timedelta(days=1), EPHEMERIS_WINDOW)
+    hub.publish("ephemeris", window.to_dict() if window else None)
+
+
+def _parse_size(size):
+    """Parse a WIDTHxHEIGHT string such as 64x32."""
+    try:
+        width, height = (int(value) for value in size.lower().split("x"))
+    except ValueError:
+        raise typer.BadParameter(f"Expected a size like 64x32, got {size}")
+    return width, height
+
+def _load_fonts(screen_height, state=None, font=DEFAULT_FONT, sizes=None):
     """Load fonts with sizes relative to the screen height.
 
     Initializes Pygame fonts and creates font objects for clock, date, and weather
-    information, with sizes dynamically scaled based on screen height.
+    information, with sizes dynamically scaled based on screen height by the
+    shares in sizes, FONT_SIZES by default.  The font file is matched once and
+    remembered in the startup state, if one is given.
     """
     pygame.font.init()
-    clock_font_size = int(screen_height * 0.3)
-    date_font_size = int(screen_height * 0.1)
-    weather_font_size = int(screen_height * 0.1)
-    weather_det_font_size = int(screen_height * 0.04)
-    clock_font = pygame.font.Font(pygame.font.match_font("arial"), clock_font_size)
-    date_font = pygame.font.Font(pygame.font.match_font("arial"), date_font_size)
-    weather_font = pygame.font.Font(pygame.font.match_font("arial"), weather_font_size)
-    weather_det_font = pygame.font.Font(pygame.font.match_font("arial"), weather_det_font_size)
+    sizes = sizes or FONT_SIZES
+    clock_font_size = int(screen_height * sizes["clock"])
+    date_font_size = int(screen_height * sizes["date"])
+    weather_font_size = int(screen_height * sizes["weather"])
+    weather_det_font_size = int(screen_height * sizes["weather_det"])
+    font_path = _match_font(font, state)
+    clock_font = pygame.font.Font(font_path, clock_font_size)
+    date_font = pygame.font.Font(font_path, date_font_size)
+    weather_font = pygame.font.Font(font_path, weather_font_size)
+    weather_det_font = pygame.font.Font(font_path, weather_det_font_size)
     return clock_font, date_font, weather_font, weather_det_font
 
-def _update_weather(zip_code, country_code, open_weather_api_key):
-    """Update weather data from OpenWeatherMap.
-
-    Fetches weather information using the provided API key and location details,
-    and loads associated weather icons.
+def _match_font(name, state=None):
+    """Return the font file for name, reusing the path saved in state while the file still exists."""
+    fonts = state.get("fonts", {}) if state is not None else {}
+    path = fonts.get(name)
+    if path and os.path.exists(path):
+        return path
+    # match_font scans fontconfig, which takes a noticeable time on a Pi
+    path = pygame.font.match_font(name)
+    if state is not None and path:
+        state.set("fonts", {**fonts, name: path})
+    return path
+
+def _start_weather_worker(zip_code, country_code, open_weather_api_key, icon_atlas, interval, daily_call_budget,
+                          weather_url=None):
+    """Create the weather client and start the background worker.
+
+    The weather modules pull in requests, so they are only imported once the
+    first frame is on screen.
     """
-    temp, feels_like, pressure, humidity, wind_speed, wind_deg, weather_reports = get_weather(zip_code, country_code, open_weather_api_key)
-    if weather_reports:
-        for report in weather_reports:
-            report["weather_icon"] = load_weather_icon(report["image_url"])
-    return temp, feels_like, pressure, humidity, wind_speed, wind_deg, weather_reports
+    from weather import set_client
+    from weather_client import WeatherClient
 
-def _get_background_colors(location, sun_rise, sun_set):
-    """Calculate background gradient colors based on sun times.
+    set_client(WeatherClient(daily_call_budget, get_cache_dir() / "weather_budget.json"))
+    return WeatherWorker(lambda: _update_weather(zip_code, country_code, open_weather_api_key, icon_atlas, weather_url),
+                         interval=interval).start()
 
-    Determines the top and bottom colors for the background gradient using the
-    location and sunrise/sunset times, making the bottom color a darker shade.
-    """
-    background_top_color = get_background_color(location, sun_rise, sun_set)
-    background_bottom_color = interpolate_color(background_top_color, (0, 0, 0), 0.5)
-    
-    print(f"Background Top Color: {background_top_color}, Bottom Color: {background_bottom_color}")
-    
-    return background_top_color, background_bottom_color
-
-
-def _calculate_text_positions(screen, now, weather_data, clock_font, date_font, weather_font, weather_det_font):
-    """Calculate the positions for displaying text elements on the screen.
+def _update_weather(zip_code, country_code, open_weather_api_key, icon_atlas, weather_url=None, image_url=None):
+    """Update weather data from OpenWeatherMap.
 
-    Determines the screen positions for the clock, date, and weather information,
-    centering them horizontally and positioning them vertically with appropriate
-    spacing.
+    Fetches weather information using the provided API key and location details,
+    and makes sure the associated weather icons are in the disk cache.  Runs on the weather worker thread and
+    raises when no observation could be fetched so the worker can back off.  weather_url and image_url
+    replace the OpenWeatherMap endpoints when given.
     """
-    screen_width, screen_height = screen.get_size()
-    time_str = now.strftime("%H:%M:%S")
-    date_str = now.strftime("%A, %B %d, %Y")
-    temp, feels_like, pressure, humidity, wind_speed, wind_deg, _ = weather_data
-    weather_text = f"{temp:.1f}°F, feels like {feels_like}°F" if temp is not None else "Weather Unavailable"
-    weather_det_text = f"Humidity: {humidity}, Pressure: {pressure}, Wind {wind_speed} {wind_deg}"
-
-    clock_text_width, clock_text_height = clock_font.size(time_str)
-    date_text_width, date_text_height = date_font.size(date_str)
-    weather_text_width, weather_text_height = weather_font.size(weather_text)
-    weather_det_text_width, weather_det_text_height = weather_det_font.size(weather_det_text)
-
-    clock_position = (
-        (screen_width - clock_text_width) // 2,
-        (screen_height - clock_text_height) // 3,
-    )
-    date_position = (
-        (screen_width - date_text_width) // 2,
-        clock_position[1] + clock_text_height + 20,
-    )
-    weather_position = (
-        (screen_width - weather_text_width) // 2,
-        date_position[1] + date_text_height + 20,
-    )
-    weather_det_position = (
-        (screen_width - weather_det_text_width) // 2,
-        weather_position[1] + weather_text_height + 20
-    )
-
-    return {
-        "clock": clock_position,
-        "date": date_position,
-        "weather": weather_position,
-        "weather_det": weather_det_position,
-        "weather_text": weather_text,
-        "weather_det_text": weather_det_text,
-    }
-
-
-def _draw_weather_icons(screen, weather_data):
+    import weather
+
+    temp, feels_like, pressure, humidity, wind_speed, wind_deg, weather_reports = weather.get_weather(
+        zip_code, country_code, open_weather_api_key, weather_url or weather.BASE_URL, image_url or weather.BASE_IMAGE_URL)
+    if temp is None:
+        raise RuntimeError("weather data unavailable")
+    for report in weather_reports:
+        icon_atlas.prefetch(report["icon"], report["image_url"])
+    return temp, feels_like, pressure, humidity, wind_speed, wind_deg, tuple(weather_reports)
+
+def _weather_condition(weather_data):
+    """Return the main condition of the first weather report, or an empty string."""
+    weather_reports = weather_data[6]
+    return weather_reports[0]["weather"] if weather_reports else ""
+
+def _cloud_cover(weather_data):
+    """Return the reported cloud cover in percent, estimated from the description if it is missing."""
+    weather_reports = weather_data[6]
+    if not weather_reports:
+        return None
+    report = weather_reports[0]
+    if report.get("cloud_cover") is not None:
+        return report["cloud_cover"]
+    return CLOUD_COVER_BY_DESCRIPTION.get(report["description"])
+
+def _draw_weather_icons(screen, weather_data, icon_atlas):
     """Draw weather icons on the screen.
 
-    Blits weather icons onto the screen based on the weather data, positioning
-    them horizontally with a fixed offset.
+    Blits weather icons from the icon atlas onto the screen based on the
+    weather data, positioning them horizontally with a fixed offset.
     """
     _, _, _, _, _, _, weather_reports = weather_data
     if weather_reports:
         weather_report_base_x = 10
         weather_report_base_y = 10
         for report in weather_reports:
-            screen.blit(report["weather_icon"], (weather_report_base_x, weather_report_base_y))
+            icon = icon_atlas.get(report["icon"])
+            if icon is None:
+                continue
+            screen.blit(icon, (weather_report_base_x, weather_report_base_y))
             weather_report_base_x = weather_report_base_y = (weather_report_base_x + 110)
             
 
-def create_clouds(width, height, count=8):
-    clouds = []
-    for _ in range(count):
-        x = random.randint(0, width)
-        y = random.randint(0, height // 2)
-        w = random.randint(100, 250)
-        h = random.randint(40, 100)
-        alpha = random.randint(30, 70)
-        speed_x = random.uniform(0.03, 0.12)  # very slow drift
-        clouds.append(Cloud(x, y, w, h, alpha, speed_x))
-    return clouds
-
-def create_stars(width, height, count=100):
-    stars = []
-    for _ in range(count):
-        x = random.randint(0, width)
-        y = random.randint(0, height)
-        radius = random.choice([1, 2])
-        color = random.choice([(255, 255, 255), (255, 255, 200)])
-        stars.append(Star(x, y, radius, color))
-    return stars
-
-def create_raindrops(width, height, count=75):
-    raindrops = []
-    for _ in range(count):
-        x = random.randint(0, width)
-        y = random.randint(-height, 0)
-        length = random.randint(5, 15)
-        speed = random.uniform(2, 5)
-        raindrops.append(Raindrop(x, y, length, speed))
-    return raindrops
+def create_clouds(width, height, count=12, rng=None):
+    return CloudField(count, width, height, rng)
+
+def create_stars(width, height, count=100, rng=None):
+    return StarField(count, width, height, rng)
+
+def create_raindrops(width, height, count=75, rng=None):
+    return RainField(count, width, height, rng)
 
 
 
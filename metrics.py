@@ -0,0 +1,152 @@
+import os
+import time
+import numpy as np
+import pygame
+
+
+class RingBuffer:
+    """Fixed-size window of the most recent samples, preallocated so adding never allocates."""
+
+    def __init__(self, size):
+        self.values = np.zeros(size, dtype=np.float64)
+        self.index = 0
+        self.count = 0
+
+    def add(self, value):
+        self.values[self.index] = value
+        self.index = (self.index + 1) % len(self.values)
+        if self.count < len(self.values):
+            self.count += 1
+
+    def percentiles(self, *quantiles):
+        if not self.count:
+            return [0.0 for _ in quantiles]
+        return np.percentile(self.values[:self.count], [q * 100 for q in quantiles]).tolist()
+
+    def total(self):
+        return float(self.values[:self.count].sum())
+
+    def full(self):
+        return self.count == len(self.values)
+
+    def clear(self):
+        self.index = 0
+        self.count = 0
+
+
+class FrameMetrics:
+    """Rolling frame-time statistics for each render stage.
+
+    Stage timings come from the compositor's profile timings; the window of
+    each stage is a RingBuffer, so recording a frame does not allocate.
+    Percentiles are only computed when the HUD or the metrics file asks.
+    """
+
+    def __init__(self, window=600):
+        self.window = window
+        self.stages = {}
+        self.frame_times = RingBuffer(window)
+        self.frame_intervals = RingBuffer(window)
+        self.first_frame = None  # Seconds from process start to the first frame on screen
+        self._last_frame = None
+
+    def record(self, timings, frame_time, now=None):
+        now = time.perf_counter() if now is None else now
+        for stage, seconds in timings.items():
+            buffer = self.stages.get(stage)
+            if buffer is None:
+                buffer = self.stages[stage] = RingBuffer(self.window)
+            buffer.add(seconds)
+        self.frame_times.add(frame_time)
+        if self._last_frame is not None:
+            self.frame_intervals.add(now - self._last_frame)
+        self._last_frame = now
+
+    def fps(self):
+        elapsed = self.frame_intervals.total()
+        return self.frame_intervals.count / elapsed if elapsed else 0.0
+
+    def summary(self):
+        """Return {stage: (p50, p99)} in seconds, including the whole frame as "frame"."""
+        summary = {stage: tuple(buffer.percentiles(0.5, 0.99)) for stage, buffer in self.stages.items()}
+        summary["frame"] = tuple(self.frame_times.percentiles(0.5, 0.99))
+        return summary
+
+
+class MetricsExporter:
+    """Periodically write frame and weather metrics in the Prometheus textfile collector format."""
+
+    def __init__(self, path, interval=15):
+        self.path = path
+        self.interval = interval
+        self._written_at = 0.0
+
+    def maybe_write(self, metrics, weather_worker, now=None):
+        now = time.time() if now is None else now
+        if now - self._written_at < self.interval:
+            return False
+        self._written_at = now
+        self.write(metrics, weather_worker)
+        return True
+
+    def write(self, metrics, weather_worker):
+        lines = [
+            "# HELP pi_led_clock_fps Frames rendered per second.",
+            "# TYPE pi_led_clock_fps gauge",
+            f"pi_led_clock_fps {metrics.fps():.3f}",
+            "# HELP pi_led_clock_stage_seconds Time spent per render stage.",
+            "# TYPE pi_led_clock_stage_seconds summary",
+        ]
+        for stage, (p50, p99) in metrics.summary().items():
+            lines.append(f'pi_led_clock_stage_seconds{{stage="{stage}",quantile="0.5"}} {p50:.6f}')
+            lines.append(f'pi_led_clock_stage_seconds{{stage="{stage}",quantile="0.99"}} {p99:.6f}')
+        if metrics.first_frame is not None:
+            lines += [
+                "# HELP pi_led_clock_first_frame_seconds Time from process start to the first frame on screen.",
+                "# TYPE pi_led_clock_first_frame_seconds gauge",
+                f"pi_led_clock_first_frame_seconds {metrics.first_frame:.3f}",
+            ]
+        lines += [
+            "# HELP pi_led_clock_weather_fetch_seconds Duration of the last weather fetch.",
+            "# TYPE pi_led_clock_weather_fetch_seconds gauge",
+            f"pi_led_clock_weather_fetch_seconds {weather_worker.fetch_seconds:.3f}",
+            "# HELP pi_led_clock_weather_fetches_total Weather fetches attempted.",
+            "# TYPE pi_led_clock_weather_fetches_total counter",
+            f"pi_led_clock_weather_fetches_total {weather_worker.fetch_count}",
+            "# HELP pi_led_clock_weather_fetch_failures_total Weather fetches that failed.",
+            "# TYPE pi_led_clock_weather_fetch_failures_total counter",
+            f"pi_led_clock_weather_fetch_failures_total {weather_worker.fetch_failures}",
+        ]
+        # Write to a temporary file and rename so the collector never reads a partial file
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                file.write("\n".join(lines) + "\n")
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Failed to write metrics file: {e}")
+
+
+class Hud:
+    """On-screen overlay showing fps and per-stage frame times, refreshed once a second."""
+
+    def __init__(self, metrics, font_size=14, color=(255, 255, 0), background=(0, 0, 0, 160)):
+        self.metrics = metrics
+        self.font = pygame.font.Font(None, font_size)
+        self.color = color
+        self.background = background
+
+    def draw(self, surface):
+        # Rendered directly rather than through the text cache, the numbers change every second
+        lines = [f"{self.metrics.fps():5.1f} fps"]
+        for stage, (p50, p99) in self.metrics.summary().items():
+            lines.append(f"{stage:<10} p50 {p50 * 1000:6.2f} ms  p99 {p99 * 1000:6.2f} ms")
+        rendered = [self.font.render(line, True, self.color) for line in lines]
+        width = max(line.get_width() for line in rendered) + 8
+        height = sum(line.get_height() for line in rendered) + 8
+        x = 4
+        y = surface.get_height() - height - 4
+        surface.fill(self.background, (x, y, width, height))
+        for line in rendered:
+            surface.blit(line, (x + 4, y + 4))
+            y += line.get_height()
@@ -1,50 +1,130 @@
 import pygame
-import ephem
 import datetime
-import pytz
+import numpy as np
+from collections import OrderedDict
 
-def get_moon_phase(timezone):
-    """Calculate the current moon phase as a value between 0 (new moon) and 1 (full moon)."""
-    now = datetime.datetime.now(pytz.timezone(timezone))
-    moon_phase = ephem.Moon(now).phase  # Returns 0 to 29.53
-    return moon_phase / 29.53  # Normalize to 0-1 scale
-    #return moon_phase % 10
+# Colors
+MOON_COLOR = (230, 230, 230)
+SHADOW_COLOR = (10, 10, 10)
+
+def get_moon_state(now=None):
+    """Return the moon's illuminated fraction (0 to 1) and whether it is waxing."""
+    # ephem is only needed at night, keep it off the startup path
+    import ephem
+
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+    date = ephem.Date(now.astimezone(datetime.timezone.utc).replace(tzinfo=None))
+    illumination = ephem.Moon(date).moon_phase
+    waxing = ephem.next_full_moon(date) < ephem.next_new_moon(date)
+    return illumination, waxing
+
+def get_moon_phase(timezone, now=None):
+    """Calculate the moon phase at now, the current time by default, as a value between 0 (new moon) and 1 (full moon)."""
+    illumination, _ = get_moon_state(now)
+    return illumination
+
+def render_moon_sprite(radius, illumination, waxing, supersample=4):
+    """Render an antialiased moon with its terminator for the given illuminated fraction.
+
+    The terminator is the half ellipse x = w * (1 - 2 * illumination), where w
+    is the half width of the disc at each row; the lit side is on the right
+    while waxing and on the left while waning.  Edges are antialiased by
+    rendering at supersample times the size and averaging down.
+    """
+    size = 2 * radius
+    steps = size * supersample
+    centers = (np.arange(steps) + 0.5) / steps * 2 - 1
+    u = centers[:, None]
+    v = centers[None, :]
+    inside = u * u + v * v <= 1
+    half_width = np.sqrt(np.clip(1 - v * v, 0, 1))
+    terminator = half_width * (1 - 2 * illumination)
+    lit = inside & ((u > terminator) if waxing else (u < -terminator))
+
+    coverage = inside.reshape(size, supersample, size, supersample).mean(axis=(1, 3))
+    lit_coverage = lit.reshape(size, supersample, size, supersample).mean(axis=(1, 3))
+    lit_share = np.divide(lit_coverage, coverage, out=np.zeros_like(coverage), where=coverage > 0)
+
+    moon = np.asarray(MOON_COLOR, dtype=np.float64)
+    shadow = np.asarray(SHADOW_COLOR, dtype=np.float64)
+    colors = shadow + (moon - shadow) * lit_share[:, :, None]
+
+    sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+    pixels = pygame.surfarray.pixels3d(sprite)
+    pixels[:] = colors.astype(np.uint8)
+    del pixels
+    alpha = pygame.surfarray.pixels_alpha(sprite)
+    alpha[:] = (coverage * 255).astype(np.uint8)
+    del alpha
+    return sprite
+
+
+class MoonRenderer:
+    """Draw the moon from cached phase sprites.
+
+    The moon state is looked up in the ephemeris table, when one covering
+    the time is set, or computed at most once per refresh_interval seconds.
+    The illuminated fraction is quantized to phase_steps steps and each
+    step's sprite is rendered once and kept in a small LRU, so a frame costs
+    one blit.
+    """
+
+    def __init__(self, refresh_interval=300, phase_steps=64, max_sprites=4, ephemeris=None):
+        self.refresh_interval = refresh_interval
+        self.ephemeris = ephemeris
+        self.phase_steps = phase_steps
+        self.max_sprites = max_sprites
+        self._sprites = OrderedDict()
+        self._state = None
+        self._state_time = None
+        self.renders = 0
+
+    def state(self, now=None):
+        """Return the cached (illumination, waxing) pair, recomputing it when it is too old."""
+        if now is None:
+            now = datetime.datetime.now(datetime.timezone.utc)
+        if self.ephemeris is not None:
+            state = self.ephemeris.moon_state(now)
+            if state is not None:
+                return state
+        if self._state is None or abs((now - self._state_time).total_seconds()) >= self.refresh_interval:
+            self._state = get_moon_state(now)
+            self._state_time = now
+        return self._state
+
+    def sprite(self, radius, illumination, waxing):
+        step = round(illumination * self.phase_steps)
+        key = (radius, step, waxing)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            return sprite
+        sprite = render_moon_sprite(radius, step / self.phase_steps, waxing)
+        self.renders += 1
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.max_sprites:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def draw(self, surface, now=None):
+        """Draw the moon in the top-right corner of surface and return its rect."""
+        width = surface.get_width()
+        height = surface.get_height()
+
+        # Moon settings
+        radius = min(width, height) // 25  # Scale moon size dynamically
+        x = width - radius - 10  # Adjust to fit in the top-right corner
+        y = radius + 20  # Adjust to fit in the top-right corner
+
+        illumination, waxing = self.state(now)
+        return surface.blit(self.sprite(radius, illumination, waxing), (x - radius, y - radius))
+
+
+_moon_renderer = MoonRenderer()
 
 def draw_moon(surface, timezone):
     """Draw the moon with the correct phase."""
-    moon_phase = get_moon_phase(timezone)  # Get phase as a value between 0 and 1
-
-    width = surface.get_width()
-    height = surface.get_height()
-
-    # Moon settings
-    radius = min(width, height) // 25  # Scale moon size dynamically
-    x = width - radius - 10  # Adjust to fit in the top-right corner
-    y = radius + 20  # Adjust to fit in the top-right corner
-
-    # Colors
-    moon_color = (230, 230, 230)
-    shadow_color = (10, 10, 10)
-
-    # Draw full moon base
-    pygame.draw.circle(surface, moon_color, (x, y), radius)
-
-    moon_phase = int(moon_phase)  # Convert to integer for switch statement
-
-    # Overlay shadow based on phase
-    if moon_phase == 0:  # New Moon
-        pygame.draw.circle(surface, shadow_color, (x, y), radius)
-    elif moon_phase == 1:  # Waxing Crescent
-        pygame.draw.rect(surface, shadow_color, (x - radius, y - radius, radius, radius * 2))
-    elif moon_phase == 2:  # First Quarter
-        pygame.draw.rect(surface, shadow_color, (x, y - radius, radius, radius * 2))
-    elif moon_phase == 3:  # Waxing Gibbous
-        pygame.draw.ellipse(surface, shadow_color, (x, y - radius, radius, radius * 2))
-    elif moon_phase == 4:  # Full Moon (nothing to draw)
-        pass
-    elif moon_phase == 5:  # Waning Gibbous
-        pygame.draw.ellipse(surface, shadow_color, (x - radius, y - radius, radius, radius * 2))
-    elif moon_phase == 6:  # Third Quarter
-        pygame.draw.rect(surface, shadow_color, (x - radius, y - radius, radius, radius * 2))
-    elif moon_phase == 7:  # Waning Crescent
-        pygame.draw.rect(surface, shadow_color, (x, y - radius, radius, radius * 2))
+    return _moon_renderer.draw(surface)
@@ -0,0 +1,380 @@
+import time
+import numpy as np
+import pygame
+from star import TWINKLE_RATE
+from cloud import CLOUD_COLOR, cloud_puffs, render_cloud_sprite
+
+# Pixel offsets covered by pygame.draw.circle for the small star radii
+STAR_STAMPS = {
+    1: [(-1, -1), (0, -1), (-1, 0), (0, 0)],
+    2: [(-1, -2), (0, -2),
+        (-2, -1), (-1, -1), (0, -1), (1, -1),
+        (-2, 0), (-1, 0), (0, 0), (1, 0),
+        (-1, 1), (0, 1)],
+}
+
+# Size of the square tiles particles report as dirty
+TILE_SIZE = 8
+
+# Cloud depth layers, far to near: size, opacity and speed relative to the
+# nearest layer, and the share of the screen height clouds may start in
+CLOUD_LAYERS = [
+    {"scale": 0.6, "alpha": 0.7, "speed": 0.5, "top": 0.3},
+    {"scale": 1.0, "alpha": 1.0, "speed": 1.0, "top": 0.5},
+]
+
+# Sub-pixel positions each cloud sprite is prerendered at
+SUBPIXEL_STEPS = 4
+
+
+class StarField:
+    """Twinkling stars kept as NumPy arrays and updated in one vectorized step.
+
+    Positions, colors, brightness and twinkle direction live in parallel
+    arrays, and every star is rasterized with a single surfarray write per
+    frame, so thousands of stars cost about what a hundred Star objects did.
+    """
+
+    def __init__(self, count, width, height, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.width = width
+        self.height = height
+        self.x = self.rng.integers(0, width + 1, count)
+        self.y = self.rng.integers(0, height + 1, count)
+        self.radius = self.rng.choice([1, 2], count)
+        palette = np.array([(255, 255, 255), (255, 255, 200)], dtype=np.float32)
+        self.color = palette[self.rng.integers(0, len(palette), count)]
+        self.brightness = np.full(count, 255.0, dtype=np.float32)
+        self.direction = self.rng.choice([-1.0, 1.0], count).astype(np.float32)
+        self._stamps = {radius: np.array(offsets) for radius, offsets in STAR_STAMPS.items()}
+        self._geometry = None
+
+    def __len__(self):
+        return len(self.x)
+
+    def update(self, dt=1 / 60):
+        self.brightness += self.rng.uniform(0, 2 * TWINKLE_RATE, len(self)).astype(np.float32) * dt * self.direction
+        over = self.brightness > 255
+        under = self.brightness < 180
+        self.brightness[over] = 255
+        self.brightness[under] = 180
+        self.direction[over | under] *= -1
+
+    def draw(self, surface):
+        """Plot every star onto surface and return the dirty tiles they cover."""
+        size = surface.get_size()
+        if self._geometry is None or self._geometry[0] != size:
+            self._geometry = (size, *self._rasterize(size))
+        _, xs, ys, owner, tiles = self._geometry
+        colors = (self.color * (self.brightness / 255)[:, None]).astype(np.uint8)
+        write_pixels(surface, xs, ys, map_colors(surface, colors, 255)[owner])
+        return tiles
+
+    def _rasterize(self, size):
+        """Return the pixels covered by every star, the star owning each and their dirty tiles.
+
+        Stars never move, so this only runs again when the target size changes.
+        """
+        xs, ys, owner = [], [], []
+        for radius, stamp in self._stamps.items():
+            chosen = np.flatnonzero(self.radius == radius)
+            xs.append((self.x[chosen][:, None] + stamp[:, 0]).ravel())
+            ys.append((self.y[chosen][:, None] + stamp[:, 1]).ravel())
+            owner.append(np.repeat(chosen, len(stamp)))
+        xs, ys, owner = np.concatenate(xs), np.concatenate(ys), np.concatenate(owner)
+        inside = (xs >= 0) & (xs < size[0]) & (ys >= 0) & (ys < size[1])
+        xs, ys, owner = xs[inside], ys[inside], owner[inside]
+        return xs, ys, owner, dirty_tiles(xs, ys, size)
+
+
+class CloudField:
+    """Drifting clouds kept as NumPy arrays and drawn from prerendered soft sprites.
+
+    Clouds sit in CLOUD_LAYERS depth layers: farther layers hold smaller,
+    fainter and slower clouds, giving parallax for about the pixel cost of a
+    single layer.  Every cloud is rendered once in SUBPIXEL_STEPS variants
+    shifted by a fraction of a pixel, so a frame advances all positions in
+    one step and picks the variant matching each cloud's fractional x, which
+    keeps slow drift smooth.  set_cover() shows a share of the clouds that
+    follows the reported cloud cover; hidden clouds cost nothing.
+    """
+
+    def __init__(self, count, width, height, rng=None, color=CLOUD_COLOR, layers=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.width = width
+        self.height = height
+        layers = layers if layers is not None else CLOUD_LAYERS
+        # Clouds are ordered far to near, which is also the order they are drawn in
+        self.layer = np.sort(self.rng.integers(0, len(layers), count))
+        scale = np.array([layer["scale"] for layer in layers])[self.layer]
+        self.w = (self.rng.integers(100, 251, count) * scale).astype(int)
+        self.h = (self.rng.integers(40, 101, count) * scale).astype(int)
+        self.x = self.rng.uniform(-self.w, width, count)
+        self.y = (self.rng.uniform(0, 1, count) * np.array([layer["top"] for layer in layers])[self.layer] * height).astype(int)
+        self.alpha = (self.rng.integers(30, 71, count) * np.array([layer["alpha"] for layer in layers])[self.layer]).astype(int)
+        self.speed = self.rng.uniform(1.8, 7.2, count) * np.array([layer["speed"] for layer in layers])[self.layer]
+        # Random rank per cloud, the lowest ranks stay visible as the cover drops
+        self.rank = self.rng.permutation(count)
+        self.visible = np.arange(count)
+        self.sprites = [self._render_sprites(w, h, alpha, color) for w, h, alpha in zip(self.w, self.h, self.alpha)]
+
+    def __len__(self):
+        return len(self.x)
+
+    def _render_sprites(self, w, h, alpha, color):
+        puffs = cloud_puffs(w, h, self.rng)
+        sprites = []
+        for step in range(SUBPIXEL_STEPS):
+            sprite = render_cloud_sprite(w, h, alpha, color, puffs, step / SUBPIXEL_STEPS)
+            if pygame.display.get_surface() is not None:
+                sprite = sprite.convert_alpha()
+            sprites.append(sprite)
+        return sprites
+
+    def set_cover(self, cover):
+        """Show the share of clouds matching cover, a percentage, or all of them for None."""
+        if cover is None:
+            shown = len(self)
+        else:
+            shown = int(np.ceil(len(self) * min(max(cover, 0), 100) / 100))
+        self.visible = np.flatnonzero(self.rank < shown)
+
+    def update(self, dt=1 / 60):
+        self.x += self.speed * dt
+        wrapped = self.x > self.width
+        self.x[wrapped] = -self.w[wrapped]
+
+    def draw(self, surface):
+        """Blit every visible cloud onto surface and return the rects they cover."""
+        x = self.x[self.visible]
+        left = np.floor(x)
+        steps = ((x - left) * SUBPIXEL_STEPS).astype(int).tolist()
+        positions = zip(left.astype(int).tolist(), self.y[self.visible].tolist())
+        sprites = [self.sprites[index][step] for index, step in zip(self.visible.tolist(), steps)]
+        return surface.blits(list(zip(sprites, positions)))
+
+
+class RainField:
+    """Falling raindrops kept as NumPy arrays and drawn as streaks.
+
+    The arrays are allocated once for count drops; only the first `active`
+    of them are updated and drawn, so intensity can change every frame
+    without creating or dropping particles.  wind, in pixels per second,
+    pushes the drops sideways and slants their streaks.
+    """
+
+    def __init__(self, count, width, height, rng=None, color=(180, 180, 255), alpha=100, wind=0.0):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.width = width
+        self.height = height
+        self.color = np.array(color, dtype=np.uint8)
+        self.alpha = alpha
+        self.wind = wind
+        self.active = count
+        self.x = self.rng.uniform(0, width + 1, count)
+        self.y = self.rng.integers(-height, 1, count).astype(np.float64)
+        self.length = self.rng.integers(5, 16, count)
+        self.speed = self.rng.uniform(120, 300, count)
+        self._steps = np.arange(self.length.max() + 1 if count else 1)
+
+    def __len__(self):
+        return len(self.x)
+
+    def update(self, dt=1 / 60):
+        active = slice(0, self.active)
+        y = self.y[active]
+        x = self.x[active]
+        y += self.speed[active] * dt
+        x += self.wind * dt
+        x %= self.width + 1
+        landed = np.flatnonzero(y > self.height)
+        if len(landed):
+            y[landed] = self.rng.integers(-50, -9, len(landed))
+
+    def draw(self, surface):
+        """Plot every active raindrop streak onto surface and return the dirty tiles they cover."""
+        width, height = surface.get_size()
+        active = slice(0, self.active)
+        length = self.length[active]
+        within = self._steps[None, :] <= length[:, None]
+        slope = self.wind / self.speed[active]
+        xs = (self.x[active, None] + slope[:, None] * self._steps[None, :]).astype(int)[within]
+        ys = (self.y[active].astype(int)[:, None] + self._steps[None, :])[within]
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        xs, ys = xs[inside], ys[inside]
+        if not len(xs):
+            return []
+        write_pixels(surface, xs, ys, map_colors(surface, self.color, self.alpha))
+        return dirty_tiles(xs, ys, (width, height))
+
+
+class SnowField:
+    """Snowflakes kept as NumPy arrays, falling slowly and swaying side to side.
+
+    Like RainField, the arrays are allocated once and `active` sets how many
+    flakes take part.  Flakes are 2 or 3 pixels across and drawn with the
+    same pixel stamps as the stars.
+    """
+
+    def __init__(self, count, width, height, rng=None, color=(240, 240, 255), alpha=200, wind=0.0):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.width = width
+        self.height = height
+        self.color = np.array(color, dtype=np.uint8)
+        self.alpha = alpha
+        self.wind = wind
+        self.active = count
+        self.x = self.rng.uniform(0, width, count)
+        self.y = self.rng.uniform(-height, 0, count)
+        self.radius = self.rng.choice([1, 2], count)
+        self.speed = self.rng.uniform(25, 70, count)
+        self.sway = self.rng.uniform(8, 25, count)
+        self.phase = self.rng.uniform(0, 2 * np.pi, count)
+        self.frequency = self.rng.uniform(0.5, 1.5, count)
+        self._stamps = {radius: np.array(offsets) for radius, offsets in STAR_STAMPS.items()}
+
+    def __len__(self):
+        return len(self.x)
+
+    def update(self, dt=1 / 60):
+        active = slice(0, self.active)
+        phase = self.phase[active]
+        phase += self.frequency[active] * dt
+        x = self.x[active]
+        x += (self.wind + self.sway[active] * np.cos(phase)) * dt
+        x %= self.width
+        y = self.y[active]
+        y += self.speed[active] * dt
+        landed = np.flatnonzero(y > self.height)
+        if len(landed):
+            y[landed] = self.rng.uniform(-20, -2, len(landed))
+
+    def draw(self, surface):
+        """Plot every active flake onto surface and return the dirty tiles they cover."""
+        width, height = surface.get_size()
+        x = self.x[:self.active].astype(int)
+        y = self.y[:self.active].astype(int)
+        radius = self.radius[:self.active]
+        xs, ys = [], []
+        for size, stamp in self._stamps.items():
+            chosen = radius == size
+            xs.append((x[chosen][:, None] + stamp[:, 0]).ravel())
+            ys.append((y[chosen][:, None] + stamp[:, 1]).ravel())
+        xs, ys = np.concatenate(xs), np.concatenate(ys)
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        xs, ys = xs[inside], ys[inside]
+        if not len(xs):
+            return []
+        write_pixels(surface, xs, ys, map_colors(surface, self.color, self.alpha))
+        return dirty_tiles(xs, ys, (width, height))
+
+
+def map_colors(surface, colors, alpha):
+    """Convert RGB colors to the values write_pixels expects for surface.
+
+    32-bit surfaces get colors packed into their pixel format, including alpha
+    when the surface has per-pixel alpha; other depths keep the RGB triples.
+    """
+    colors = np.asarray(colors)
+    if surface.get_bytesize() != 4:
+        return colors
+    red, green, blue, alpha_shift = surface.get_shifts()
+    colors = colors.astype(np.uint32)
+    packed = (colors[..., 0] << red) | (colors[..., 1] << green) | (colors[..., 2] << blue)
+    if surface.get_flags() & pygame.SRCALPHA:
+        packed |= np.uint32(alpha << alpha_shift)
+    return packed
+
+
+def write_pixels(surface, xs, ys, values):
+    """Write map_colors() values to the pixels at xs, ys, which must lie inside surface."""
+    if surface.get_bytesize() == 4:
+        pixels = pygame.surfarray.pixels2d(surface)
+    else:
+        pixels = pygame.surfarray.pixels3d(surface)
+    pixels[xs, ys] = values
+    del pixels
+
+
+def dirty_tiles(xs, ys, size, tile=TILE_SIZE, max_rects=256):
+    """Return rects covering every tile that holds at least one of the given pixels.
+
+    Neighbouring tiles in a row are merged into one rect, keeping the rect
+    count low without sorting the pixels.  When the pixels are spread over
+    more than max_rects runs a single bounding rect is returned instead.
+    """
+    if not len(xs):
+        return []
+    columns = -(-size[0] // tile)
+    rows = -(-size[1] // tile)
+    grid = np.zeros((rows, columns + 2), dtype=np.int8)
+    grid[ys // tile, xs // tile + 1] = 1
+    edges = np.diff(grid, axis=1)
+    start_rows, start_columns = np.nonzero(edges == 1)
+    _, end_columns = np.nonzero(edges == -1)
+    if len(start_rows) > max_rects:
+        left, top = start_columns.min() * tile, start_rows.min() * tile
+        return [pygame.Rect(left, top, end_columns.max() * tile - left, (start_rows.max() + 1) * tile - top)]
+    return [pygame.Rect(left * tile, row * tile, (right - left) * tile, tile)
+            for row, left, right in zip(start_rows.tolist(), start_columns.tolist(), end_columns.tolist())]
+
+
+def benchmark(counts=(100, 1000, 5000), frames=200, size=(800, 480)):
+    """Compare per-frame cost of the particle fields with the per-object classes.
+
+    Returns a list of (kind, count, object_ms, field_ms) tuples.
+    """
+    from star import Star
+    from cloud import Cloud
+    from raindrop import Raindrop
+
+    rng = np.random.default_rng(0)
+    width, height = size
+    surface = pygame.Surface(size, pygame.SRCALPHA)
+    results = []
+
+    def per_frame(step):
+        start = time.perf_counter()
+        for _ in range(frames):
+            step()
+        return (time.perf_counter() - start) / frames * 1000
+
+    for count in counts:
+        stars = [Star(int(x), int(y), int(r), (255, 255, 255)) for x, y, r in
+                 zip(rng.integers(0, width, count), rng.integers(0, height, count), rng.choice([1, 2], count))]
+        field = StarField(count, width, height, rng)
+        results.append(("stars", count,
+                        per_frame(lambda: [(star.update(), star.draw(surface)) for star in stars]),
+                        per_frame(lambda: (field.update(), field.draw(surface)))))
+
+        drops = [Raindrop(int(x), float(y), int(length), float(speed)) for x, y, length, speed in
+                 zip(rng.integers(0, width, count), rng.integers(-height, 0, count), rng.integers(5, 16, count), rng.uniform(120, 300, count))]
+        rain = RainField(count, width, height, rng)
+        results.append(("rain", count,
+                        per_frame(lambda: [(drop.update(height), drop.draw(surface)) for drop in drops]),
+                        per_frame(lambda: (rain.update(), rain.draw(surface)))))
+
+        cloud_count = max(1, count // 10)
+        cloud_objects = [Cloud(int(x), int(y), 150, 60, 50, 6) for x, y in
+                         zip(rng.integers(0, width, cloud_count), rng.integers(0, height // 2, cloud_count))]
+        clouds = CloudField(cloud_count, width, height, rng)
+
+        def draw_cloud_objects():
+            # The per-object path drew into a full-screen layer blended onto the target
+            cloud_surface = pygame.Surface(size, pygame.SRCALPHA)
+            for cloud in cloud_objects:
+                cloud.update(width)
+                cloud.draw(cloud_surface)
+            surface.blit(cloud_surface, (0, 0))
+
+        results.append(("clouds", cloud_count,
+                        per_frame(draw_cloud_objects),
+                        per_frame(lambda: (clouds.update(), clouds.draw(surface)))))
+    return results
+
+
+if __name__ == "__main__":
+    pygame.init()
+    print(f"{'kind':<8}{'count':>8}{'objects ms':>14}{'arrays ms':>14}")
+    for kind, count, object_ms, field_ms in benchmark():
+        print(f"{kind:<8}{count:>8}{object_ms:>14.3f}{field_ms:>14.3f}")
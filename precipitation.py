@@ -0,0 +1,175 @@
+import time
+import numpy as np
+from particles import RainField, SnowField
+
+# Particle pools for an 800x480 panel, scaled with the panel area and allocated
+# once at full size; intensity only changes how many particles take part
+RAIN_POOL = 1200
+SNOW_POOL = 700
+
+# Share of each frame interval the precipitation may use, including composing the frame it is in
+FRAME_SHARE = 0.5
+
+# Base intensity per OpenWeatherMap condition, scaled by the words in the description
+CONDITION_EFFECTS = {
+    "drizzle": ("rain", 0.25),
+    "rain": ("rain", 0.5),
+    "thunderstorm": ("storm", 0.7),
+    "snow": ("snow", 0.5),
+}
+INTENSITY_WORDS = [
+    ("extreme", 2.0),
+    ("very heavy", 1.8),
+    ("heavy", 1.5),
+    ("shower", 1.2),
+    ("light", 0.5),
+]
+
+# Storm settings: sideways wind on the rain and how often lightning flashes
+STORM_WIND = 90
+LIGHTNING_INTERVAL = (4.0, 12.0)
+LIGHTNING_DURATION = 0.12
+LIGHTNING_COLOR = (255, 255, 255, 70)
+
+
+def precipitation_for(weather_reports):
+    """Return the (effect, intensity) of the strongest precipitation in weather_reports, or None.
+
+    effect is "rain", "snow" or "storm" and intensity runs from 0 to 1.
+    """
+    strongest = None
+    for report in weather_reports:
+        effect = CONDITION_EFFECTS.get(report["weather"])
+        if effect is None:
+            continue
+        kind, intensity = effect
+        description = report.get("description", "")
+        for word, scale in INTENSITY_WORDS:
+            if word in description:
+                intensity *= scale
+                break
+        if kind == "snow" and "rain" in description:
+            kind = "rain"  # Sleet and rain-and-snow fall like rain
+        intensity = min(intensity, 1.0)
+        if strongest is None or intensity > strongest[1]:
+            strongest = (kind, intensity)
+    return strongest
+
+
+class Precipitation:
+    """Rain, snow and storm effects drawn from preallocated particle pools within a time budget.
+
+    set_weather() picks the effect and a target particle count from the
+    reports.  After each frame, end_frame() is given the time the frame took
+    to compose; together with the time draw() took, it gives a cost per
+    particle that is folded into a running estimate, and the active count is
+    capped at what fits in budget seconds.  A heavy storm thus sheds
+    particles instead of pushing the frame past its deadline.  Shed
+    particles come back gradually once there is headroom again.
+    """
+
+    def __init__(self, width, height, budget=FRAME_SHARE / 30, rng=None):
+        self.width = width
+        self.height = height
+        self.budget = budget
+        self.rng = rng if rng is not None else np.random.default_rng()
+        scale = width * height / (800 * 480)
+        self.rain = RainField(int(RAIN_POOL * scale), width, height, self.rng)
+        self.snow = SnowField(int(SNOW_POOL * scale), width, height, self.rng)
+        self.density = 1.0
+        self.effect = None
+        self.field = None
+        self.intensity = 0.0
+        self.target = 0
+        self.limit = 0
+        self.cost = None  # Seconds per active particle, smoothed
+        self.shed_frames = 0
+        self.draw_seconds = None  # Seconds the last draw() took, until end_frame() accounts for it
+        self._flash_until = 0.0
+        self._next_flash = 0.0
+        self._clock = 0.0
+
+    @property
+    def active(self):
+        return self.field.active if self.field is not None else 0
+
+    def set_frame_rate(self, max_fps):
+        """Budget FRAME_SHARE of each frame at max_fps."""
+        self.budget = FRAME_SHARE / max_fps
+
+    def set_density(self, density):
+        """Scale the particles every effect asks for by density, between 0 and 1."""
+        self.density = density
+        if self.field is not None:
+            self._set_target()
+
+    def set_weather(self, weather_reports):
+        """Switch to the precipitation in weather_reports, or to none."""
+        found = precipitation_for(weather_reports)
+        if found is None:
+            self.effect = self.field = None
+            self.target = 0
+            return
+        self.effect, self.intensity = found
+        self.field = self.snow if self.effect == "snow" else self.rain
+        self.rain.wind = STORM_WIND if self.effect == "storm" else 0.0
+        self._set_target()
+        if self.effect == "storm":
+            self._schedule_flash()
+
+    def _set_target(self):
+        self.target = max(1, int(round(len(self.field) * self.intensity * self.density)))
+        self.limit = self.target
+        self.field.active = self.target
+
+    def draw(self, surface, dt):
+        """Advance and draw the current effect, returning the rects it covers."""
+        if self.field is None:
+            return []
+        started = time.perf_counter()
+        self._clock += dt
+        rects = self._draw_lightning(surface) if self.effect == "storm" else []
+        self.field.update(dt)
+        rects += self.field.draw(surface)
+        self.draw_seconds = time.perf_counter() - started
+        return rects
+
+    def end_frame(self, present_seconds):
+        """Charge the frame's draw and compose time to the particles and size the next frame.
+
+        present_seconds is the compose time only, without draw_seconds.
+        """
+        if self.draw_seconds is None or self.field is None:
+            return
+        self._account(self.draw_seconds + present_seconds)
+        self.draw_seconds = None
+
+    def _account(self, elapsed):
+        """Fold elapsed into the per-particle cost and set the particle count for the next frame."""
+        field = self.field
+        per_particle = elapsed / max(field.active, 1)
+        self.cost = per_particle if self.cost is None else 0.8 * self.cost + 0.2 * per_particle
+        affordable = int(self.budget / self.cost)
+        if elapsed > self.budget or affordable < self.limit:
+            # Over budget: drop straight to what fits, with a margin for jitter
+            self.limit = max(1, min(self.limit, int(affordable * 0.8)))
+            self.shed_frames += 1
+        elif self.limit < self.target:
+            # Headroom: let a few particles back in
+            self.limit = min(self.target, affordable, self.limit + max(1, self.target // 50))
+        field.active = min(self.target, self.limit)
+
+    def _schedule_flash(self):
+        self._next_flash = self._clock + self.rng.uniform(*LIGHTNING_INTERVAL)
+
+    def _draw_lightning(self, surface):
+        if self._clock >= self._next_flash:
+            self._flash_until = self._clock + LIGHTNING_DURATION
+            self._schedule_flash()
+        if self._clock >= self._flash_until:
+            return []
+        # Light up the sky above the clock, the drawn rect is erased again on the next frame
+        rect = surface.get_rect()
+        rect.height //= 3
+        surface.fill(LIGHTNING_COLOR, rect)
+        return [rect]
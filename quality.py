@@ -0,0 +1,136 @@
+import time
+from metrics import RingBuffer
+
+# Quality tiers, best first.  Particle counts are for an 800x480 panel and are
+# scaled with the panel area; precipitation scales the particles each effect
+# asks for; gradient_step is how many scanlines share one computed sky color.
+QUALITY_TIERS = [
+    {"name": "ultra", "stars": 200, "clouds": 16, "precipitation": 1.0, "clock_glow": 3, "text_glow": 2, "gradient_step": 1, "max_fps": 60},
+    {"name": "high", "stars": 100, "clouds": 12, "precipitation": 1.0, "clock_glow": 3, "text_glow": 2, "gradient_step": 1, "max_fps": 30},
+    {"name": "medium", "stars": 60, "clouds": 8, "precipitation": 0.6, "clock_glow": 2, "text_glow": 1, "gradient_step": 2, "max_fps": 30},
+    {"name": "low", "stars": 40, "clouds": 5, "precipitation": 0.35, "clock_glow": 1, "text_glow": 0, "gradient_step": 4, "max_fps": 20},
+    {"name": "minimal", "stars": 20, "clouds": 3, "precipitation": 0.2, "clock_glow": 0, "text_glow": 0, "gradient_step": 8, "max_fps": 10},
+]
+
+# Share of a frame interval a frame may take to render
+TARGET_SHARE = 0.8
+# A tier is only raised while frames would take less than this share of the better tier's target
+RAISE_SHARE = 0.5
+
+
+def get_tier(name):
+    """Return the quality tier called name."""
+    for tier in QUALITY_TIERS:
+        if tier["name"] == name:
+            return tier
+    raise ValueError(f"Unknown quality {name!r}, expected auto or one of {', '.join(tier['name'] for tier in QUALITY_TIERS)}")
+
+
+class QualityGovernor:
+    """Pick the best quality tier the host can render within its frame-time target.
+
+    calibrate() renders a few full frames at each tier, best first, and
+    settles on the first that fits.  After that record() is given the render
+    time of every animated frame; once a window of frames is in, the tier is
+    lowered as soon as the 90th percentile misses the target, and raised
+    only after raise_windows windows in a row comfortably beat the better
+    tier's target and the tier has held for hold seconds.  A raise that has
+    to be undone soon after doubles the hold, so a host sitting between two
+    tiers settles instead of flipping back and forth.
+
+    apply is called with each tier chosen.  The frame-rate cap of a tier is
+    limited to max_fps, and the target is TARGET_SHARE of its frame interval.
+    """
+
+    def __init__(self, apply, max_fps=60, tiers=None, window=90, raise_windows=3, hold=30.0, clock=time.monotonic):
+        self.apply = apply
+        self.max_fps = max_fps
+        self.tiers = tiers if tiers is not None else QUALITY_TIERS
+        self.frames = RingBuffer(window)
+        self.raise_windows = raise_windows
+        self.hold = hold
+        self.clock = clock
+        self.index = 0
+        self.changes = 0
+        self._good_windows = 0
+        self._changed_at = clock()
+        self._raised_at = None
+
+    @property
+    def tier(self):
+        return self.tiers[self.index]
+
+    def frame_rate(self, tier=None):
+        """The frame-rate cap of tier, the current one by default."""
+        tier = tier or self.tier
+        return min(tier["max_fps"], self.max_fps)
+
+    def target(self, tier=None):
+        """Seconds a frame may take to render at tier, the current one by default."""
+        return TARGET_SHARE / self.frame_rate(tier)
+
+    def calibrate(self, render, frames=5, time_limit=2.0):
+        """Time frames calls of render at each tier, best first, and settle on the first that fits.
+
+        Tiers that are left untried once time_limit seconds have passed are
+        skipped in favour of the lowest one.
+        """
+        started = self.clock()
+        out_of_time = False
+        for index in range(len(self.tiers)):
+            self._set(index)
+            timings = RingBuffer(frames)
+            for _ in range(frames):
+                frame_start = time.perf_counter()
+                render()
+                timings.add(time.perf_counter() - frame_start)
+            median = timings.percentiles(0.5)[0]
+            if median <= self.target():
+                break
+            if self.clock() - started > time_limit and index < len(self.tiers) - 1:
+                out_of_time = True
+                break
+        if out_of_time:
+            # The lowest tier is not timed, so the last measurement is of the tier tried before it
+            print(f"Quality calibration ran out of time at {self.tier['name']}: {median * 1000:.1f} ms per frame, "
+                  f"target {self.target() * 1000:.1f} ms; falling back to {self.tiers[-1]['name']}")
+            self._set(len(self.tiers) - 1)
+        else:
+            print(f"Quality calibrated to {self.tier['name']}: {median * 1000:.1f} ms per frame, "
+                  f"target {self.target() * 1000:.1f} ms")
+        self._changed_at = self.clock()
+        self._raised_at = None
+
+    def record(self, frame_time):
+        """Add the render time of one animated frame, changing tier when a full window calls for it."""
+        self.frames.add(frame_time)
+        if not self.frames.full() or self.frames.index != 0:
+            return
+        slow = self.frames.percentiles(0.9)[0]
+        now = self.clock()
+        if slow > self.target() and self.index < len(self.tiers) - 1:
+            if self._raised_at is not None and now - self._raised_at < 2 * self.hold:
+                self.hold = min(self.hold * 2, 600)  # The last raise did not hold, wait longer before the next one
+            self._change(self.index + 1, slow)
+        elif self.index > 0 and slow < RAISE_SHARE * self.target(self.tiers[self.index - 1]):
+            self._good_windows += 1
+            if self._good_windows >= self.raise_windows and now - self._changed_at >= self.hold:
+                self._change(self.index - 1, slow)
+                self._raised_at = now
+        else:
+            self._good_windows = 0
+
+    def _change(self, index, slow):
+        old = self.tier
+        self._set(index)
+        print(f"Quality {old['name']} -> {self.tier['name']}: p90 frame {slow * 1000:.1f} ms, "
+              f"target {self.target(old) * 1000:.1f} ms")
+        self.changes += 1
+        self._changed_at = self.clock()
+
+    def _set(self, index):
+        self.index = index
+        # Frames from the old tier say nothing about the new one
+        self.frames.clear()
+        self._good_windows = 0
+        self.apply(self.tier)
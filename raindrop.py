@@ -5,11 +5,11 @@ class Raindrop:
         self.x = x
         self.y = y
         self.length = length
-        self.speed = speed
+        self.speed = speed  # pixels per second
         self.color = (180, 180, 255, 100)  # soft blue with transparency
 
-    def update(self, height):
-        self.y += self.speed
+    def update(self, height, dt=1 / 60):
+        self.y += self.speed * dt
         if self.y > height:
             self.y = random.randint(-50, -10)  # restart above screen
 
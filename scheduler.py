@@ -0,0 +1,63 @@
+import math
+import time
+import pygame
+
+# Frame rate caps used while something on screen is animating
+POWER_PROFILES = {
+    "eco": 1,
+    "low": 15,
+    "balanced": 30,
+    "smooth": 60,
+}
+
+
+class FrameScheduler:
+    """Decide when the next frame is due and sleep until then.
+
+    With nothing animating the loop only wakes just after each wall clock
+    second boundary, which is all the clock needs.  While an animated layer is
+    active frames are spaced by the profile's frame rate cap, still never
+    sleeping past the next second boundary.  wait() returns the elapsed time
+    since the previous frame so animations can advance by time instead of by
+    frame count.
+    """
+
+    def __init__(self, max_fps=30, boundary_slack=0.002, sleep=None, now=time.time):
+        self.max_fps = max_fps
+        self.boundary_slack = boundary_slack
+        self.sleep = sleep or _wait_for_event
+        self.now = now
+        self._last_frame = now()
+
+    @classmethod
+    def from_profile(cls, profile, **kwargs):
+        if profile not in POWER_PROFILES:
+            raise ValueError(f"Unknown power profile {profile!r}, expected one of {', '.join(POWER_PROFILES)}")
+        return cls(POWER_PROFILES[profile], **kwargs)
+
+    def next_frame_time(self, animating):
+        now = self.now()
+        next_second = math.floor(now) + 1 + self.boundary_slack
+        if not animating or self.max_fps <= 1:
+            return next_second
+        return min(next_second, self._last_frame + 1 / self.max_fps)
+
+    def wait(self, animating):
+        """Sleep until the next frame is due and return the seconds since the previous one."""
+        delay = self.next_frame_time(animating) - self.now()
+        if delay > 0:
+            self.sleep(delay)
+        now = self.now()
+        elapsed = now - self._last_frame
+        self._last_frame = now
+        return elapsed
+
+
+def _wait_for_event(seconds):
+    """Sleep for up to seconds, returning early if an event arrives so input stays responsive."""
+    if not pygame.display.get_init():
+        time.sleep(seconds)
+        return
+    event = pygame.event.wait(max(1, int(seconds * 1000)))
+    if event.type != pygame.NOEVENT:
+        pygame.event.post(event)
@@ -0,0 +1,170 @@
+import datetime
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Keep stdout clean for the JSON report
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+import pytz
+import typer
+from bench import DATE, LOCATION, icon_fixture, weather_fixture
+from clock import WarpClock, WarpScheduler
+from ephemeris import EphemerisTable, build_table
+from history import WeatherHistory
+from main import ClockScene
+from quality import get_tier
+from util import setup_headless_display
+
+app = typer.Typer()
+
+# Weather the soak cycles through, one report per simulated hour
+WEATHER_CYCLE = [
+    ("clear", "clear sky", "01"),
+    ("clouds", "broken clouds", "04"),
+    ("rain", "moderate rain", "10"),
+    ("snow", "light snow", "13"),
+    ("thunderstorm", "thunderstorm with heavy rain", "11"),
+    ("clouds", "few clouds", "02"),
+]
+
+
+def count_surfaces():
+    """Return the number of live pygame surfaces and the bytes of pixels they hold.
+
+    Surfaces are not tracked by the garbage collector, so they are found
+    through the objects that refer to them.
+    """
+    surfaces = {}
+    for holder in gc.get_objects():
+        for referent in gc.get_referents(holder):
+            if isinstance(referent, pygame.Surface):
+                surfaces[id(referent)] = referent
+    pixels = sum(surface.get_width() * surface.get_height() * surface.get_bytesize()
+                 for surface in surfaces.values() if surface.get_parent() is None)
+    return len(surfaces), pixels
+
+
+def sample(hour, now):
+    gc.collect()
+    surfaces, surface_bytes = count_surfaces()
+    return {"hour": hour, "time": now.isoformat(), "traced_bytes": tracemalloc.get_traced_memory()[0],
+            "objects": len(gc.get_objects()), "surfaces": surfaces, "surface_bytes": surface_bytes}
+
+
+def growth_per_hour(samples, key):
+    """Least-squares slope of samples[key] per simulated hour."""
+    if len(samples) < 2:
+        return 0.0
+    hours = np.array([entry["hour"] for entry in samples], dtype=np.float64)
+    values = np.array([entry[key] for entry in samples], dtype=np.float64)
+    return float(np.polyfit(hours, values, 1)[0])
+
+
+def run_soak(hours=24, speed=720, fps=30, width=800, height=480, quality="high", seed=0, warmup=6):
+    """Run the clock scene through hours of simulated time and sample its memory every simulated hour.
+
+    Time comes from a WarpClock advanced by speed / fps seconds per frame,
+    the weather moves through WEATHER_CYCLE every hour, and into the trend
+    charts, and all randomness is seeded, so two runs with the same
+    arguments render the same frames.
+    Returns the hourly samples and a tracemalloc snapshot from the end of
+    the warm-up and from the end of the run.
+    """
+    screen = setup_headless_display(width, height)
+    tz = pytz.timezone(LOCATION.timezone)
+    clock = WarpClock(tz.localize(datetime.datetime.combine(DATE, datetime.time())), speed)
+    scheduler = WarpScheduler(clock, fps, realtime=False)
+    start = clock.now(tz)
+    days = hours // 24 + 2
+    ephemeris = EphemerisTable(build_table(LOCATION, DATE, days), DATE, LOCATION.latitude, LOCATION.longitude,
+                               LOCATION.timezone)
+
+    samples = []
+    snapshots = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        icon_atlas = icon_fixture(Path(cache_dir))
+        history = WeatherHistory(Path(cache_dir) / "weather_history.bin")
+        tracemalloc.start()
+        try:
+            scene = ClockScene(screen, LOCATION, icon_atlas, start, quality=get_tier(quality), ephemeris=ephemeris,
+                               rng=np.random.default_rng(seed), history=history)
+            dt = 1 / fps
+            hour = 0
+            while hour <= hours:
+                now = clock.now(tz)
+                elapsed = int((now - start).total_seconds() // 3600)
+                if elapsed >= hour:
+                    condition, description, icon = WEATHER_CYCLE[hour % len(WEATHER_CYCLE)]
+                    is_day = scene.sky_timeline.sunrise <= now <= scene.sky_timeline.sunset
+                    weather = weather_fixture(condition, description, icon + ("d" if is_day else "n"))
+                    scene.set_weather(weather)
+                    # The history is kept on wall-clock time, like the weather it records
+                    observation = history.append(time.time(), weather)
+                    if observation is not None:
+                        scene.add_history(observation)
+                    samples.append(sample(hour, now))
+                    if hour in (warmup, hours):
+                        snapshots[hour] = tracemalloc.take_snapshot()
+                    hour += 1
+                scene.update(now, dt)
+                scene.present()
+                dt = scheduler.wait(scene.animating())
+        finally:
+            tracemalloc.stop()
+            history.close()
+    return samples, snapshots.get(warmup), snapshots.get(hours)
+
+
+@app.command()
+def soak(
+    hours: int = typer.Option(24, help="Simulated hours to run"),
+    speed: float = typer.Option(720, help="Simulated seconds per real second of frames, 720 runs a day in two minutes of frames"),
+    fps: int = typer.Option(30, help="Frames per real second the simulated time is spread over"),
+    width: int = typer.Option(800, help="Panel width to render at"),
+    height: int = typer.Option(480, help="Panel height to render at"),
+    quality: str = typer.Option("high", help="Quality tier to render at"),
+    seed: int = typer.Option(0, help="Seed for the stars, clouds and rain"),
+    warmup: int = typer.Option(6, help="Simulated hours to let caches fill before growth is measured"),
+    max_bytes_per_hour: int = typer.Option(16384, help="Allowed growth of Python allocations per simulated hour"),
+    max_objects_per_hour: float = typer.Option(20, help="Allowed growth of live objects per simulated hour"),
+    max_surfaces_per_hour: float = typer.Option(0.1, help="Allowed growth of live surfaces per simulated hour"),
+    max_surface_bytes_per_hour: int = typer.Option(65536, help="Allowed growth of surface pixel memory per simulated hour"),
+    output: Path = typer.Option(None, help="Write the JSON results to this file"),
+):
+    """
+    Render simulated hours headless under tracemalloc and fail if memory grows
+    """
+    if warmup >= hours:
+        raise typer.BadParameter("The warm-up must be shorter than the run")
+    samples, warm, end = run_soak(hours, speed, fps, width, height, quality, seed, warmup)
+    steady = [entry for entry in samples if entry["hour"] >= warmup]
+    growth = {key: round(growth_per_hour(steady, key), 2)
+              for key in ("traced_bytes", "objects", "surfaces", "surface_bytes")}
+    limits = {"traced_bytes": max_bytes_per_hour, "objects": max_objects_per_hour, "surfaces": max_surfaces_per_hour,
+              "surface_bytes": max_surface_bytes_per_hour}
+    failures = [f"{key} grew {growth[key]} per simulated hour, limit {limit}"
+                for key, limit in limits.items() if growth[key] > limit]
+    report = json.dumps({"hours": hours, "speed": speed, "fps": fps, "resolution": [width, height],
+                         "growth_per_hour": growth, "samples": samples}, indent=2)
+    if output:
+        output.write_text(report)
+    print(report)
+
+    if failures:
+        for failure in failures:
+            print(f"Memory not flat: {failure}", file=sys.stderr)
+        for stat in end.compare_to(warm, "lineno")[:10]:
+            print(f"  {stat}", file=sys.stderr)
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
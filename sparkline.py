@@ -0,0 +1,98 @@
+import math
+from collections import deque
+import pygame
+
+
+class Sparkline:
+    """A small line chart of recent samples, drawn one column at a time.
+
+    The chart keeps its own surface with one column_width wide column per
+    sample, the newest on the right, and holds the samples of the last
+    window seconds that fit.  A new sample scrolls the chart left by a
+    column and draws only the segment to it.  The whole chart is drawn
+    again only when the value range changes: a sample outside the range
+    drawn so far, or a sample at its edge dropping out of the chart.
+    """
+
+    def __init__(self, size, color, window, column_width=4, min_range=1.0):
+        self.size = size
+        self.color = color
+        self.window = window
+        self.column_width = column_width
+        self.min_range = min_range
+        self.columns = max(2, size[0] // column_width)
+        self.times = deque(maxlen=self.columns)
+        self.values = deque(maxlen=self.columns)
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.low = self.high = None
+        self.redraws = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def set_samples(self, times, values):
+        """Replace the chart with samples given as times and values, oldest first."""
+        self.times.clear()
+        self.values.clear()
+        for timestamp, value in zip(times, values):
+            if not math.isnan(value):
+                self.times.append(float(timestamp))
+                self.values.append(float(value))
+        self._drop_before(self.times[-1] - self.window if self.times else 0)
+        self._redraw()
+
+    def append(self, timestamp, value):
+        """Add a sample at the right of the chart."""
+        if math.isnan(value):
+            return
+        value = float(value)
+        full = len(self.values) == self.columns
+        dropped = [self.values[0]] if full else []
+        self.times.append(float(timestamp))
+        self.values.append(value)
+        dropped += self._drop_before(timestamp - self.window)
+        if self.low is None or not self.low <= value <= self.high or self.low in dropped or self.high in dropped:
+            self._redraw()
+            return
+        width, height = self.size
+        self.surface.scroll(-self.column_width, 0)
+        last = self.columns - 1
+        self.surface.fill((0, 0, 0, 0), (last * self.column_width, 0, width - last * self.column_width, height))
+        # Nothing is left of the oldest sample, clear what scrolled in from the samples dropped
+        self.surface.fill((0, 0, 0, 0), (0, 0, self._x(0), height))
+        if len(self.values) > 1:
+            pygame.draw.line(self.surface, self.color, self._point(len(self.values) - 2),
+                             self._point(len(self.values) - 1), 2)
+
+    def draw(self, surface, position):
+        surface.blit(self.surface, position)
+
+    def _drop_before(self, start):
+        dropped = []
+        while self.times and self.times[0] < start:
+            self.times.popleft()
+            dropped.append(self.values.popleft())
+        return dropped
+
+    def _redraw(self):
+        self.surface.fill((0, 0, 0, 0))
+        self.redraws += 1
+        if not self.values:
+            self.low = self.high = None
+            return
+        self.low, self.high = min(self.values), max(self.values)
+        points = [self._point(index) for index in range(len(self.values))]
+        if len(points) > 1:
+            pygame.draw.lines(self.surface, self.color, False, points, 2)
+
+    def _x(self, index):
+        # Samples are right-aligned, the newest in the last column
+        return (self.columns - len(self.values) + index) * self.column_width + self.column_width // 2
+
+    def _point(self, index):
+        # The range is widened to min_range around its middle, so a steady value draws a flat line mid-chart
+        middle = (self.low + self.high) / 2
+        half = max(self.high - self.low, self.min_range) / 2
+        height = self.size[1] - 2
+        y = 1 + (middle + half - self.values[index]) / (2 * half) * height
+        return self._x(index), round(y)
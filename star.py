@@ -1,5 +1,9 @@
 import random
 import pygame
+
+# Average brightness change per second while twinkling
+TWINKLE_RATE = 90
+
 class Star:
     def __init__(self, x, y, radius, color):
         self.x = x
@@ -9,9 +13,9 @@ class Star:
         self.brightness = 255
         self.twinkle_direction = random.choice([-1, 1])
 
-    def update(self):
-        # Optional twinkle effect
-        delta = random.randint(0, 3) * self.twinkle_direction
+    def update(self, dt=1 / 60):
+        # Optional twinkle effect, scaled by the time since the last update
+        delta = random.uniform(0, 2 * TWINKLE_RATE) * dt * self.twinkle_direction
         self.brightness += delta
         if self.brightness > 255:
             self.brightness = 255
@@ -22,4 +26,4 @@ class Star:
 
     def draw(self, surface):
         c = tuple(min(255, max(0, int(channel * (self.brightness / 255)))) for channel in self.color)
-        pygame.draw.circle(surface, c, (self.x, self.y), self.radius)
+        return pygame.draw.circle(surface, c, (self.x, self.y), self.radius)
@@ -0,0 +1,45 @@
+import json
+import os
+import threading
+
+
+class StartupState:
+    """Small JSON file of values that are slow to resolve and rarely change.
+
+    The clock saves the resolved location and font paths here so the next
+    boot can draw its first frame from them without a network call or a
+    fontconfig scan.  Values are refreshed in the background and saved
+    atomically, and a missing or corrupt file is treated as empty.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if isinstance(data, dict):
+                self._data = data
+        except (OSError, ValueError):
+            pass
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def set(self, key, value):
+        """Store value under key and save the file if it changed."""
+        with self._lock:
+            if self._data.get(key) == value:
+                return
+            self._data = {**self._data, key: value}
+            self._save()
+
+    def _save(self):
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self._data, file, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Failed to save startup state: {e}")
@@ -0,0 +1,147 @@
+import numpy as np
+import pygame
+from collections import OrderedDict
+
+# Multiplier on the blurred text coverage, so a soft halo still reads at small radii
+GLOW_STRENGTH = 2.0
+
+
+class TextCache:
+    """LRU cache of rendered text surfaces.
+
+    Each entry holds the text already composited with its glow, keyed by
+    (font, text, color, glow_color, glow_radius), so drawing a string that has
+    not changed costs a single blit and no font rendering.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+
+    def get(self, font, text, color, glow_color, glow_radius):
+        key = (font, text, tuple(color), tuple(glow_color), glow_radius)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = self.render(font, text, color, glow_color, glow_radius)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def render(self, font, text, color, glow_color, glow_radius):
+        """Render text over its blurred glow into one surface padded by glow_radius on every side."""
+        text_surface = font.render(text, True, color)
+        self.renders += 1
+        if glow_radius <= 0:
+            return text_surface
+        surface = self.render_halo(font, text, glow_color, glow_radius)
+        surface.blit(text_surface, (glow_radius, glow_radius))
+        return surface
+
+    def render_halo(self, font, text, glow_color, glow_radius):
+        """Render only the glow of text: its shape blurred by glow_radius, padded by glow_radius."""
+        mask = font.render(text, True, (255, 255, 255))
+        self.renders += 1
+        width, height = mask.get_size()
+        coverage = np.zeros((width + 2 * glow_radius, height + 2 * glow_radius))
+        coverage[glow_radius:glow_radius + width, glow_radius:glow_radius + height] = pygame.surfarray.array_alpha(mask)
+        halo = pygame.Surface(coverage.shape, pygame.SRCALPHA)
+        halo.fill((*glow_color[:3], 0))
+        alpha = pygame.surfarray.pixels_alpha(halo)
+        alpha[:] = np.clip(blur(coverage, glow_radius) * GLOW_STRENGTH, 0, 255).astype(np.uint8)
+        del alpha
+        return halo
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "renders": self.renders, "entries": len(self._surfaces)}
+
+    def clear(self):
+        self._surfaces.clear()
+
+
+class DigitAtlas:
+    """Prebuilt glyphs for a clock font, composed per character.
+
+    Every character of the atlas is rendered once, with its blurred glow kept
+    as a separate halo, so a new second only needs one blit per character of
+    the time string for the halos and one for the text.  Drawing every halo
+    before any text keeps a character's glow from spilling over its
+    neighbour.  Characters outside the atlas fall back to the shared text
+    cache.
+    """
+
+    def __init__(self, font, color, glow_color, glow_radius, characters="0123456789:", cache=None):
+        self.font = font
+        self.color = color
+        self.glow_color = glow_color
+        self.glow_radius = glow_radius
+        self.cache = cache or text_cache
+        self.glyphs = {}
+        self.halos = {}
+        self.advances = {}
+        self.renders = 0
+        for char in characters:
+            self.glyphs[char] = font.render(char, True, color)
+            if glow_radius > 0:
+                self.halos[char] = self.cache.render_halo(font, char, glow_color, glow_radius)
+            self.advances[char] = font.size(char)[0]
+            self.renders += 1
+        self.hits = 0
+        self.misses = 0
+
+    def size(self, text):
+        """Return the (width, height) of text as composed by the atlas."""
+        width = sum(self.advances.get(char) or self.font.size(char)[0] for char in text)
+        return width, self.font.get_height()
+
+    def draw(self, surface, text, position):
+        x, y = position
+        halos = []
+        glyphs = []
+        for char in text:
+            glyph = self.glyphs.get(char)
+            if glyph is not None:
+                self.hits += 1
+                advance = self.advances[char]
+                glyphs.append((glyph, (x, y)))
+                if self.glow_radius > 0:
+                    halos.append((self.halos[char], (x - self.glow_radius, y - self.glow_radius)))
+            else:
+                self.misses += 1
+                glyph = self.cache.get(self.font, char, self.color, self.glow_color, self.glow_radius)
+                advance = self.font.size(char)[0]
+                glyphs.append((glyph, (x - self.glow_radius, y - self.glow_radius)))
+            x += advance
+        surface.blits(halos + glyphs, doreturn=False)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "renders": self.renders, "glyphs": len(self.glyphs)}
+
+
+def blur(values, radius):
+    """Gaussian blur of a 2D array, done as two 1D passes with a kernel reaching radius pixels.
+
+    Values within radius of the border blur against zeros, so callers pad
+    the array when the result must not be clipped.
+    """
+    if radius <= 0:
+        return values
+    offsets = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (offsets / (radius / 2)) ** 2)
+    kernel /= kernel.sum()
+    for axis in (0, 1):
+        padded = np.pad(values, [(radius, radius) if a == axis else (0, 0) for a in range(2)])
+        size = values.shape[axis]
+        values = sum(weight * padded.take(range(i, i + size), axis=axis) for i, weight in enumerate(kernel))
+    return values
+
+
+text_cache = TextCache()
@@ -3,9 +3,10 @@ import sys
 import pygame
 import json
 import pytz
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta, timezone, tzinfo
 from pathlib import Path
 from types import SimpleNamespace
+from text import text_cache
 
 # Constants
 BLACK = (0, 0, 0)
@@ -19,11 +20,16 @@ def get_current_time(utc_offset: int):
     now = datetime.now(offset)
     return now
 
-def get_current_time(timezone_name: str):
-    tz = pytz.timezone(timezone_name)
+def get_current_time(timezone_name):
+    """Get the current time in a timezone, given by name or as a tzinfo from get_timezone."""
+    tz = timezone_name if isinstance(timezone_name, tzinfo) else pytz.timezone(timezone_name)
     now = datetime.now(tz)
     return now
 
+def get_timezone(timezone_name: str):
+    """Resolve a timezone name once, for callers that ask for the time every frame."""
+    return pytz.timezone(timezone_name)
+
 def setup_display(display: str, video_driver: str, screen_width: int, screen_height: int):
     """
     Set up the display environment and initialize pygame.
@@ -67,6 +73,23 @@ def setup_display(display: str, video_driver: str, screen_width: int, screen_hei
     #this screen object is what is used to create everything else
     return screen 
 
+def setup_headless_display(screen_width: int, screen_height: int):
+    """
+    Initialize pygame on the SDL dummy video driver and return an off-screen sized screen.
+    """
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pygame.init()
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    pygame.font.init()
+    return screen
+
+def get_cache_dir():
+    """Return the directory used for persistent caches and state, creating it if needed."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    cache_dir = Path(base) / "pi-led-clock"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
 def interpolate_color(color1, color2, factor):
     """Linearly interpolate between two colors."""
     return tuple(int(c1 + (c2 - c1) * factor) for c1, c2 in zip(color1, color2))
@@ -82,14 +105,9 @@ def get_config(file_path = "config.json"):
 def draw_text(surface, text, font, color, position, glow_color, glow_radius):
     """Draw text with a glow effect on a surface.
 
-    Renders the given text with a specified glow, by blurring the text using
-    multiple blits with an offset.
+    Renders the given text over a halo made by blurring its shape by
+    glow_radius.  The composited result is cached, so unchanged text is a
+    single blit whatever the radius.
     """
-    
-    glow_surface = font.render(text, True, glow_color)
-    for offset in range(1, glow_radius + 1):
-        glow_pos = (position[0] - offset, position[1] - offset)
-        surface.blit(glow_surface, glow_pos)
-    # Render the main text
-    text_surface = font.render(text, True, color)
-    surface.blit(text_surface, position)
\ No newline at end of file
+    text_surface = text_cache.get(font, text, color, glow_color, glow_radius)
+    surface.blit(text_surface, (position[0] - glow_radius, position[1] - glow_radius))
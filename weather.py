@@ -3,24 +3,38 @@ import pygame
 import random
 import math
 import io
+from weather_client import WeatherClient
 
 # OpenWeatherMap API Config
 BASE_URL = "http://api.openweathermap.org/data/2.5/weather"
 BASE_IMAGE_URL = "https://openweathermap.org/img/wn/"
 
+_default_client = None
+
+def get_client():
+    """Return the shared weather client, creating one with default settings if needed."""
+    global _default_client
+    if _default_client is None:
+        _default_client = WeatherClient()
+    return _default_client
+
+def set_client(client):
+    """Use client for all weather and icon requests."""
+    global _default_client
+    _default_client = client
+
 # Function to fetch weather data
-def get_weather(zip_code, country_code, api_key):
+def get_weather(zip_code, country_code, api_key, base_url=BASE_URL, image_url=BASE_IMAGE_URL):
     """Fetch weather data from OpenWeatherMap based on zip code.
 
     Retrieves temperature, feels-like temperature, pressure, humidity, wind speed,
-    wind direction, and weather reports from the OpenWeatherMap API.
+    wind direction, and weather reports from the OpenWeatherMap API.  base_url
+    and image_url may point at another server, such as a local stand-in.
     """
     try:
         print (f"Determining weather for {zip_code}...")
-        url = f"{BASE_URL}?zip={zip_code},{country_code}&appid={api_key}&units=imperial"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+        url = f"{base_url}?zip={zip_code},{country_code}&appid={api_key}&units=imperial"
+        data = get_client().get_json(url, "weather")
         temp = data["main"]["temp"]
         pressure = data["main"]["pressure"]
         humidity = data["main"]["humidity"]
@@ -28,28 +42,30 @@ def get_weather(zip_code, country_code, api_key):
         wind_speed = data["wind"]["speed"]
         wind_deg = data["wind"]["deg"]
         wind_dir = _wind_direction(wind_deg, 16)
+        cloud_cover = data.get("clouds", {}).get("all")  # percent of the sky covered
         reports = []
         for report in data["weather"]:
             weather = report["main"].lower()  # e.g., "clear", "clouds", "rain"
             image = report["icon"]
-            image_url = f"{BASE_IMAGE_URL}{image}@2x.png"
+            icon_url = f"{image_url}{image}@2x.png"
             description = report["description"]
             reports.append({"weather": weather,
                             "description": description,
-                            "image_url": image_url
+                            "icon": image,
+                            "image_url": icon_url,
+                            "cloud_cover": cloud_cover
                             })
             
         return temp, feels_like, pressure, humidity, wind_speed, wind_dir, reports
     except Exception as e:
         print(f"Error fetching weather data: {e}")
-        return None, None, None, None, None, None
+        return None, None, None, None, None, None, []
 
 def load_weather_icon(url):
     """Download the weather icon from OpenWeatherMap and return as a Pygame surface."""
     try:
-        response = requests.get(url, timeout=5)  # Fetch the image
-        response.raise_for_status()  # Raise error if request fails
-        image = pygame.image.load(io.BytesIO(response.content))  # Convert to Pygame image
+        content = get_client().get(url, "icon")  # Fetch the image
+        image = pygame.image.load(io.BytesIO(content))  # Convert to Pygame image
         return pygame.transform.scale(image, (100, 100))  # Resize if needed
     except requests.RequestException as e:
         print(f"Failed to load weather icon: {e}")
@@ -0,0 +1,309 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Keep stdout clean for the JSON report
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+import typer
+import weather
+from icons import IconAtlas
+from main import _update_weather
+from weather_client import BudgetExceeded, WeatherClient
+from weather_worker import WeatherWorker
+
+app = typer.Typer()
+
+# What the stand-in answers for the current weather, in the OpenWeatherMap format
+OBSERVATION = {
+    "weather": [{"main": "Clear", "description": "clear sky", "icon": "01d"}],
+    "main": {"temp": 71.6, "feels_like": 70.9, "pressure": 1016, "humidity": 48},
+    "wind": {"speed": 6.9, "deg": 230},
+    "clouds": {"all": 0},
+}
+
+# Validator of OBSERVATION, which never changes, so every conditional request is answered 304
+ETAG = '"observation-1"'
+
+# Timeouts short enough for a hanging server to fail a fetch within the check, and no retries
+# inside the client so every fetch the worker makes is one request to the stand-in
+CHECK_ENDPOINTS = {
+    "weather": {"timeout": (0.5, 0.5), "retries": 0, "budgeted": True},
+    "icon": {"timeout": (0.5, 0.5), "retries": 0, "budgeted": False},
+}
+
+
+class StandIn(ThreadingHTTPServer):
+    """A local stand-in for the OpenWeatherMap API that records what it is asked.
+
+    mode picks the answer to weather requests: "ok" answers at once, "slow"
+    after delay seconds and "hang" not at all until released is set.  The
+    next throttled weather requests are refused with a 503 and a Retry-After
+    of retry_after seconds instead.  Weather answers carry an ETag and must
+    be revalidated, and a request with a matching If-None-Match gets a 304.
+    Icons are served under /img/ whatever the mode.  The arrival time of
+    every weather request is kept in requests, and connections and
+    not_modified count the connections accepted and the 304s sent.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.mode = "ok"
+        self.delay = 0.0
+        self.requests = []
+        self.throttled = 0
+        self.retry_after = 1
+        self.connections = 0
+        self.not_modified = 0
+        self.released = threading.Event()
+        icon = io.BytesIO()
+        pygame.image.save(pygame.Surface((4, 4), pygame.SRCALPHA), icon, "icon.png")
+        self.icon = icon.getvalue()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="stand-in", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.released.set()
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # A client that timed out has hung up, which the checks see for themselves
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so the client can reuse its connection
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        if self.path.startswith("/img/"):
+            self._send(200, self.server.icon, "image/png")
+            return
+        self.server.requests.append(time.monotonic())
+        if self.server.mode == "hang":
+            self.server.released.wait()
+            self.close_connection = True
+            return
+        if self.server.mode == "slow":
+            time.sleep(self.server.delay)
+        if self.server.throttled:
+            self.server.throttled -= 1
+            self._send(503, b"", "text/plain", {"Retry-After": str(self.server.retry_after)})
+            return
+        headers = {"ETag": ETAG, "Cache-Control": "no-cache"}
+        if self.headers.get("If-None-Match") == ETAG:
+            self.server.not_modified += 1
+            self._send(304, b"", None, headers)
+            return
+        self._send(200, json.dumps(OBSERVATION).encode(), "application/json", headers)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def wait_for(condition, timeout):
+    """Poll condition until it holds or timeout seconds pass, returning whether it held."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def check_worker(server, cache_dir, slow_delay=0.3):
+    """Fetch through the weather worker from the stand-in answering at once, slowly, hanging and again at once.
+
+    slow_delay must stay under the read timeout of CHECK_ENDPOINTS, so the slow fetch succeeds.
+    """
+    weather.set_client(WeatherClient(1000, cache_dir / "weather_budget.json", endpoints=CHECK_ENDPOINTS))
+    atlas = IconAtlas(cache_dir=cache_dir / "icons")
+    worker = WeatherWorker(lambda: _update_weather("21201", "us", "key", atlas, f"{server.url}/data/2.5/weather",
+                                                   f"{server.url}/img/"),
+                           interval=60, retry_min=0.3, retry_max=5, jitter=0, stale_after=1.5)
+    results = {}
+    try:
+        worker.start()
+        fetched = wait_for(lambda: worker.snapshot.version == 1, 5)
+        results["fetch"] = {
+            "passed": fetched and atlas.path("01d").exists() and not worker.is_stale(),
+            "temp": worker.snapshot.data[0],
+            "icon_cached": atlas.path("01d").exists(),
+        }
+
+        # A render loop at 30 fps reads the snapshot while the slow fetch is in flight
+        server.mode, server.delay = "slow", slow_delay
+        worker.refresh_now()
+        longest_frame = 0.0
+        shown = set()
+        deadline = time.monotonic() + slow_delay + 3
+        last = time.perf_counter()
+        while worker.snapshot.version < 2 and time.monotonic() < deadline:
+            shown.add(worker.snapshot.version)
+            time.sleep(1 / 30)
+            now = time.perf_counter()
+            longest_frame, last = max(longest_frame, now - last), now
+        results["slow"] = {
+            "passed": worker.snapshot.version == 2 and shown == {1} and longest_frame < 0.1
+                      and worker.fetch_seconds >= slow_delay,
+            "fetch_seconds": round(worker.fetch_seconds, 3),
+            "longest_frame_seconds": round(longest_frame, 3),
+        }
+
+        # Every fetch from a hanging server times out, and the worker waits longer before each retry
+        server.mode = "hang"
+        good = worker.snapshot
+        hung_from = len(server.requests)
+        worker.refresh_now()
+        failed = wait_for(lambda: worker.snapshot.failures >= 3, 10)
+        attempts = server.requests[hung_from:hung_from + 3]
+        gaps = [later - earlier for earlier, later in zip(attempts, attempts[1:])]
+        results["hang"] = {
+            "passed": failed and len(gaps) == 2 and gaps[1] > gaps[0] and worker.snapshot.data == good.data
+                      and worker.snapshot.version == good.version and bool(worker.snapshot.error) and worker.is_stale(),
+            "failures": worker.snapshot.failures,
+            "retry_gaps_seconds": [round(gap, 3) for gap in gaps],
+            "kept_last_good": worker.snapshot.data == good.data,
+            "stale": worker.is_stale(),
+            "error": worker.snapshot.error,
+        }
+
+        server.mode = "ok"
+        server.released.set()
+        worker.refresh_now()
+        recovered = wait_for(lambda: worker.snapshot.version == good.version + 1, 5)
+        results["recover"] = {
+            "passed": recovered and worker.snapshot.failures == 0 and not worker.is_stale(),
+            "failures": worker.snapshot.failures,
+        }
+    finally:
+        worker.stop(timeout=0)
+    return results
+
+
+def check_client(server, cache_dir):
+    """Call the stand-in through the weather client and check what reached the server."""
+    url = f"{server.url}/data/2.5/weather?zip=21201,us&appid=key&units=imperial"
+    endpoints = {**CHECK_ENDPOINTS, "weather": {"timeout": (2, 2), "retries": 1, "budgeted": True}}
+    results = {}
+
+    # Three calls share one keep-alive connection and the last two are revalidated, not downloaded
+    client = WeatherClient(1000, cache_dir / "reuse_budget.json", endpoints=endpoints)
+    bodies = [client.get_json(url) for _ in range(3)]
+    client.close()
+    results["reuse"] = {"passed": server.connections == 1, "connections": server.connections,
+                        "requests": len(server.requests)}
+    results["revalidate"] = {
+        "passed": server.not_modified == 2 and client.not_modified == 2 and all(body == OBSERVATION for body in bodies),
+        "served_304": server.not_modified,
+        "client_not_modified": client.not_modified,
+    }
+
+    # A 503 is retried after its Retry-After, which is longer than any backoff the client picks itself
+    client = WeatherClient(1000, cache_dir / "retry_budget.json", endpoints=endpoints)
+    server.throttled, server.retry_after = 1, 1
+    asked = len(server.requests)
+    started = time.monotonic()
+    try:
+        answered = client.get_json(url) == OBSERVATION
+    except Exception as e:
+        answered = False
+        print(f"Retry-After check failed: {e}")
+    waited = time.monotonic() - started
+    client.close()
+    results["retry_after"] = {
+        "passed": answered and waited >= server.retry_after and len(server.requests) - asked == 2,
+        "waited_seconds": round(waited, 3),
+        "requests": len(server.requests) - asked,
+    }
+
+    # The daily budget is saved, so a new client picks up the count and refuses the call over it
+    path = cache_dir / "budget.json"
+    asked = len(server.requests)
+    first = WeatherClient(3, path, endpoints=endpoints)
+    for _ in range(2):
+        first.get(url)
+    first.close()
+    second = WeatherClient(3, path, endpoints=endpoints)
+    second.get(url)
+    try:
+        second.get(url)
+        refused = False
+    except BudgetExceeded:
+        refused = True
+    second.close()
+    results["budget"] = {
+        "passed": refused and len(server.requests) - asked == 3 and second.budget.calls == 3,
+        "calls_saved": second.budget.calls,
+        "requests": len(server.requests) - asked,
+        "refused_fourth": refused,
+    }
+    return results
+
+
+@app.command()
+def check(
+    output: Path = typer.Option(None, help="Write the JSON results to this file"),
+):
+    """
+    Check the weather worker and client against a local stand-in for OpenWeatherMap
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir, contextlib.redirect_stdout(sys.stderr):
+        # Each group gets a stand-in of its own, so the connections it counts are only that group's
+        for group, run in (("worker", check_worker), ("client", check_client)):
+            group_dir = Path(cache_dir) / group
+            group_dir.mkdir()
+            server = StandIn().start()
+            try:
+                results[group] = run(server, group_dir)
+            finally:
+                server.stop()
+    report = json.dumps(results, indent=2)
+    if output:
+        output.write_text(report)
+    print(report)
+
+    failures = [f"{group} {name}" for group, checks in results.items()
+                for name, result in checks.items() if not result["passed"]]
+    if failures:
+        for failure in failures:
+            print(f"Check failed: {failure}", file=sys.stderr)
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,197 @@
+import json
+import random
+import threading
+import time
+import requests
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+
+# Per endpoint settings: (connect, read) timeouts, retry attempts and whether
+# calls count against the daily API budget.  Icons come from a CDN and are
+# not metered against the API key.
+ENDPOINTS = {
+    "weather": {"timeout": (3.05, 10), "retries": 2, "budgeted": True},
+    "icon": {"timeout": (3.05, 5), "retries": 2, "budgeted": False},
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class BudgetExceeded(requests.RequestException):
+    """Raised instead of calling the API once the daily call budget is spent."""
+
+
+class CallBudget:
+    """Count API calls per UTC day and refuse calls over the limit.
+
+    The count is saved to `path` when given, so restarting the clock does not
+    reset the day's usage.
+    """
+
+    def __init__(self, max_calls, path=None):
+        self.max_calls = max_calls
+        self.path = path
+        self._lock = threading.Lock()
+        self.day = _utc_day()
+        self.calls = 0
+        self._load()
+
+    def remaining(self):
+        with self._lock:
+            self._roll()
+            return max(0, self.max_calls - self.calls)
+
+    def spend(self):
+        with self._lock:
+            self._roll()
+            if self.calls >= self.max_calls:
+                raise BudgetExceeded(f"daily API budget of {self.max_calls} calls used up")
+            self.calls += 1
+            self._save()
+
+    def _roll(self):
+        today = _utc_day()
+        if today != self.day:
+            self.day = today
+            self.calls = 0
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if data.get("day") == self.day:
+            self.calls = int(data.get("calls", 0))
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "w", encoding="utf-8") as file:
+                json.dump({"day": self.day, "calls": self.calls}, file)
+        except OSError as e:
+            print(f"Failed to save API budget: {e}")
+
+
+class WeatherClient:
+    """HTTP client shared by the weather API call and the icon downloads.
+
+    Uses one pooled keep-alive `requests.Session`, applies per endpoint
+    timeouts and retries with exponential backoff, and honours Cache-Control,
+    ETag and Last-Modified so fresh responses are served from memory and
+    unchanged ones are revalidated with a conditional request instead of
+    being downloaded again.  endpoints replaces the ENDPOINTS settings, such
+    as shorter timeouts for a check against a local server.
+    """
+
+    def __init__(self, daily_budget=1000, budget_path=None, backoff=0.5, pool_size=4, max_cached=64, session=None,
+                 endpoints=None):
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.budget = CallBudget(daily_budget, budget_path)
+        self.backoff = backoff
+        self.endpoints = endpoints or ENDPOINTS
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self.requests = 0
+        self.not_modified = 0
+        self.cache_hits = 0
+
+    def get_json(self, url, endpoint="weather"):
+        return json.loads(self.get(url, endpoint))
+
+    def get(self, url, endpoint="weather"):
+        """Return the body of url, from cache when still fresh."""
+        entry = self._cache.get(url)
+        if entry is not None and entry["expires"] > time.time():
+            self._cache.move_to_end(url)
+            self.cache_hits += 1
+            return entry["content"]
+
+        settings = self.endpoints[endpoint]
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self._send(url, headers, settings)
+        if response.status_code == 304 and entry is not None:
+            self.not_modified += 1
+            content = entry["content"]
+        else:
+            response.raise_for_status()
+            content = response.content
+        self._store(url, response, content, entry)
+        return content
+
+    def close(self):
+        self.session.close()
+
+    def _send(self, url, headers, settings):
+        attempt = 0
+        while True:
+            if settings["budgeted"]:
+                self.budget.spend()
+            self.requests += 1
+            try:
+                response = self.session.get(url, headers=headers, timeout=settings["timeout"])
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= settings["retries"]:
+                    raise
+                delay = None
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= settings["retries"]:
+                    return response
+                delay = _retry_after(response)
+            if delay is None:
+                delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            time.sleep(delay)
+            attempt += 1
+
+    def _store(self, url, response, content, previous=None):
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if "no-store" in cache_control:
+            self._cache.pop(url, None)
+            return
+        max_age = 0
+        if "no-cache" not in cache_control:
+            for directive in cache_control.split(","):
+                name, _, value = directive.strip().partition("=")
+                if name == "max-age" and value.isdigit():
+                    max_age = int(value)
+        # A 304 may omit the validators, keep the ones we already had
+        previous = previous if response.status_code == 304 and previous else {}
+        self._cache[url] = {
+            "content": content,
+            "etag": response.headers.get("ETag") or previous.get("etag"),
+            "last_modified": response.headers.get("Last-Modified") or previous.get("last_modified"),
+            "expires": time.time() + max_age,
+        }
+        self._cache.move_to_end(url)
+        if len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+
+def _retry_after(response, limit=60):
+    """Seconds asked for by a Retry-After header, capped at limit."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.isdigit():
+        return min(limit, int(value))
+    try:
+        return min(limit, max(0, parsedate_to_datetime(value).timestamp() - time.time()))
+    except (TypeError, ValueError):
+        return None
+
+
+def _utc_day():
+    return time.strftime("%Y-%m-%d", time.gmtime())
@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+from typing import NamedTuple
+
+EMPTY_WEATHER = (None, None, None, None, None, None, ())
+
+
+class WeatherSnapshot(NamedTuple):
+    """An immutable weather observation handed from the worker to the render loop."""
+
+    data: tuple = EMPTY_WEATHER
+    fetched_at: float = 0.0
+    version: int = 0
+    failures: int = 0
+    error: str = ""
+
+    def age(self, now=None):
+        if not self.fetched_at:
+            return float("inf")
+        return (now if now is not None else time.time()) - self.fetched_at
+
+    def is_stale(self, max_age, now=None):
+        return self.age(now) > max_age
+
+
+class WeatherWorker:
+    """Refresh weather on a background thread.
+
+    The fetch callable runs off the render thread and must return the weather
+    tuple or raise on failure.  Each successful result is published as a new
+    WeatherSnapshot by a single reference assignment, so the render loop can
+    read `snapshot` every frame without locking and keeps showing the last
+    good observation while a refresh is in flight or failing.  Failures are
+    retried with jittered exponential backoff.
+    """
+
+    def __init__(self, fetch, interval=3600, retry_min=30, retry_max=900, jitter=0.25, stale_after=None):
+        self.fetch = fetch
+        self.interval = interval
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.jitter = jitter
+        self.stale_after = stale_after if stale_after is not None else interval * 2
+        self.snapshot = WeatherSnapshot()
+        # Fetch statistics for the metrics exporter
+        self.fetch_seconds = 0.0
+        self.fetch_count = 0
+        self.fetch_failures = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="weather-worker", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def refresh_now(self):
+        """Ask the worker to fetch immediately instead of waiting for the next interval."""
+        self._wake.set()
+
+    def is_stale(self, now=None):
+        return self.snapshot.is_stale(self.stale_after, now)
+
+    def next_delay(self, failures):
+        """Seconds to wait before the next fetch given the consecutive failure count."""
+        if failures == 0:
+            delay = self.interval
+        else:
+            delay = min(self.retry_max, self.retry_min * 2 ** (failures - 1))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._refresh()
+            self._wake.wait(self.next_delay(self.snapshot.failures))
+            self._wake.clear()
+
+    def _refresh(self):
+        current = self.snapshot
+        started = time.perf_counter()
+        try:
+            data = self.fetch()
+        except Exception as e:
+            self._count_fetch(started, failed=True)
+            print(f"Weather refresh failed: {e}")
+            self.snapshot = current._replace(failures=current.failures + 1, error=str(e))
+            return
+        self._count_fetch(started)
+        self.snapshot = WeatherSnapshot(data, time.time(), current.version + 1, 0, "")
+
+    def _count_fetch(self, started, failed=False):
+        self.fetch_seconds = time.perf_counter() - started
+        self.fetch_count += 1
+        if failed:
+            self.fetch_failures += 1